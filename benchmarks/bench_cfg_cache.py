@@ -0,0 +1,30 @@
+"""Benchmark merge_from_file with and without the on-disk config cache."""
+
+import os
+import shutil
+import tempfile
+
+import yacs.config
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    yaml_file = os.path.join(tmp_dir, "cfg.yaml")
+    cache_dir = os.path.join(tmp_dir, "cache")
+    print_header("leaves", "uncached (s)", "cached (s)", "speedup")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg = CN(make_cfg_dict(depth, width))
+        with open(yaml_file, "w") as f:
+            f.write(cfg.dump())
+        t_uncached = best_time(lambda: cfg.merge_from_file(yaml_file), 3)
+        yacs.config.set_cfg_cache(cache_dir)
+        t_cached = best_time(lambda: cfg.merge_from_file(yaml_file), 3)
+        yacs.config.set_cfg_cache(None)
+        print_row(count_leaves(cfg), t_uncached, t_cached, t_uncached / t_cached)
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Benchmark clone() vs clone(copy_on_write=True) of a frozen config.
+
+Mimics a sweep driver: clone a frozen base config many times and override a few
+keys in every clone. Reports the latency per clone (+ overrides) and the memory
+held by all the clones.
+"""
+
+import tracemalloc
+
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def make_clones(base, num_clones, copy_on_write):
+    clones = []
+    for i in range(num_clones):
+        cfg = base.clone(copy_on_write=copy_on_write)
+        cfg.merge_from_list(["NODE_0.NODE_1.LEAF_0", i, "NODE_1.LEAF_2", "p" + str(i)])
+        clones.append(cfg)
+    return clones
+
+
+def clones_memory(base, num_clones, copy_on_write):
+    tracemalloc.start()
+    clones = make_clones(base, num_clones, copy_on_write)  # noqa: F841
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+
+def main():
+    num_clones = 100
+    print_header("depth", "width", "leaves", "mode", "clone (s)", "memory (MB)")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg_dict = make_cfg_dict(depth, width)
+        base = CN(cfg_dict)
+        base.freeze()
+        for copy_on_write in (False, True):
+            t = best_time(lambda: make_clones(base, 10, copy_on_write), 3) / 10
+            mem = clones_memory(base, num_clones, copy_on_write) / float(2 ** 20)
+            mode = "cow" if copy_on_write else "deepcopy"
+            print_row(depth, width, count_leaves(cfg_dict), mode, t, mem)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark merge throughput with the table-driven type coercion.
+
+`legacy_check_and_coerce` reproduces the previous _check_and_coerce_cfg_value_type,
+which built its list of casts and formatted the full key of every leaf on each
+call, and `legacy_merge_a_into_b` the merge that used it, for comparison (it reads
+values as the current merge does, so that only the coercion differs). Half of the
+merged layers swap lists and tuples, so that values are actually coerced.
+"""
+
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+from yacs.config import (
+    _VALID_TYPES,
+    _decode_or_copy_value,
+    _get_child_for_read,
+    _get_child_for_update,
+    _items,
+    _merge_a_into_b,
+)
+
+
+def legacy_check_and_coerce(replacement, original, key, full_key):
+    original_type = type(original)
+    replacement_type = type(replacement)
+    if replacement_type == original_type:
+        return replacement
+    if (replacement_type is type(None) and original_type in _VALID_TYPES) or (
+        original_type is type(None) and replacement_type in _VALID_TYPES
+    ):
+        return replacement
+
+    def conditional_cast(from_type, to_type):
+        if replacement_type == from_type and original_type == to_type:
+            return True, to_type(replacement)
+        else:
+            return False, None
+
+    casts = [(tuple, list), (list, tuple)]
+    try:
+        casts.append((str, unicode))  # noqa: F821
+    except Exception:
+        pass
+    for (from_type, to_type) in casts:
+        converted, converted_value = conditional_cast(from_type, to_type)
+        if converted:
+            return converted_value
+    raise ValueError("Type mismatch for config key: {}".format(full_key))
+
+
+def legacy_merge_a_into_b(a, b, root, key_list):
+    assert isinstance(a, CN), "`a` (cur type {}) must be an instance of {}".format(
+        type(a), CN
+    )
+    assert isinstance(b, CN), "`b` (cur type {}) must be an instance of {}".format(
+        type(b), CN
+    )
+    for k, v_ in _items(a):
+        full_key = ".".join(key_list + [k])
+        if k in b:
+            original = _get_child_for_read(b, k)
+            if isinstance(v_, CN) and type(original) is type(b):
+                legacy_merge_a_into_b(
+                    v_, _get_child_for_update(b, k), root, key_list + [k]
+                )
+                continue
+            v = _decode_or_copy_value(b, v_)
+            b[k] = legacy_check_and_coerce(v, original, k, full_key)
+        else:
+            raise KeyError("Non-existent config key: {}".format(full_key))
+
+
+def swap_sequences(d):
+    swapped = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            v = swap_sequences(v)
+        elif type(v) is tuple:
+            v = list(v)
+        elif type(v) is list:
+            v = tuple(v)
+        swapped[k] = v
+    return swapped
+
+
+def merge_layers(merge_fn, base, layers):
+    cfg = base.clone()
+    for layer in layers:
+        merge_fn(layer, cfg, cfg, [])
+
+
+def main():
+    num_layers = 10
+    print_header("leaves", "legacy (s)", "current (s)", "leaves/s", "speedup")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg_dict = make_cfg_dict(depth, width)
+        base = CN(cfg_dict)
+        layers = [
+            CN(swap_sequences(cfg_dict) if i % 2 else cfg_dict)
+            for i in range(num_layers)
+        ]
+        t_old = best_time(lambda: merge_layers(legacy_merge_a_into_b, base, layers), 10)
+        t_new = best_time(lambda: merge_layers(_merge_a_into_b, base, layers), 10)
+        leaves = count_leaves(cfg_dict)
+        print_row(leaves, t_old, t_new, int(leaves * num_layers / t_new), t_old / t_new)
+
+
+if __name__ == "__main__":
+    main()
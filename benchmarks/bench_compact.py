@@ -0,0 +1,38 @@
+"""Compare the memory used by CfgNode and CompactCfgNode trees, and the cost of
+reading a deep key.
+"""
+
+import tracemalloc
+
+from bench_freeze import count_nodes
+from common import best_time, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode, CompactCfgNode
+
+
+def traced_memory_mb(fn):
+    tracemalloc.start()
+    result = fn()  # noqa: F841
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / 1e6
+
+
+def read_deep_key(cfg):
+    for _ in range(1000):
+        cfg.NODE_0.NODE_1.NODE_1.LEAF_0
+
+
+def main():
+    print_header("nodes", "class", "memory (MB)", "bytes/node", "read (s)")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg_dict = make_cfg_dict(depth, width)
+        num_nodes = count_nodes(CfgNode(cfg_dict))
+        for cls in (CfgNode, CompactCfgNode):
+            memory = traced_memory_mb(lambda: cls(cfg_dict))
+            cfg = cls(cfg_dict)
+            t = best_time(lambda: read_deep_key(cfg))
+            print_row(num_nodes, cls.__name__, memory, memory * 1e6 / num_nodes, t)
+
+
+if __name__ == "__main__":
+    main()
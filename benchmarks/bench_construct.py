@@ -0,0 +1,41 @@
+"""Benchmark CfgNode construction from nested dicts as depth and width grow.
+
+`DeepcopyCfgNode` reproduces the previous construction path, which deep-copied
+the dict at every level of the tree, for comparison.
+"""
+
+import copy
+
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+from yacs.config import _VALID_TYPES, _assert_with_logging, _valid_type
+
+
+class DeepcopyCfgNode(CN):
+    @classmethod
+    def _create_config_tree_from_dict(cls, dic, key_list):
+        dic = copy.deepcopy(dic)
+        for k, v in dic.items():
+            if isinstance(v, dict):
+                dic[k] = cls(v, key_list=key_list + [k])
+            else:
+                _assert_with_logging(
+                    _valid_type(v, allow_cfg_node=False),
+                    "Key {} with value {} is not a valid type; valid types: {}".format(
+                        ".".join(key_list + [str(k)]), type(v), _VALID_TYPES
+                    ),
+                )
+        return dic
+
+
+def main():
+    print_header("depth", "width", "leaves", "deepcopy (s)", "current (s)", "speedup")
+    for depth, width in [(2, 8), (4, 4), (6, 3), (8, 2), (10, 2), (3, 30)]:
+        cfg_dict = make_cfg_dict(depth, width)
+        t_old = best_time(lambda: DeepcopyCfgNode(cfg_dict), repeat=3)
+        t_new = best_time(lambda: CN(cfg_dict), repeat=3)
+        print_row(depth, width, count_leaves(cfg_dict), t_old, t_new, t_old / t_new)
+
+
+if __name__ == "__main__":
+    main()
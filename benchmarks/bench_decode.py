@@ -0,0 +1,53 @@
+"""Microbenchmark of CfgNode._decode_cfg_value on typical override values.
+
+`legacy_decode` reproduces the previous decoding, which called literal_eval on
+every string, for comparison.
+"""
+
+from ast import literal_eval
+
+from common import best_time, print_header, print_row
+from yacs.config import CfgNode as CN
+
+OVERRIDE_VALUES = [
+    "coco_2017_train",
+    "/datasets/coco/annotations/instances_train2017.json",
+    "R-50-FPN",
+    "0.02",
+    "90000",
+    "(60000, 80000)",
+    "[0.5, 1.0, 2.0]",
+    "True",
+    "None",
+    "output/sweep/run_17",
+]
+
+
+def legacy_decode(value):
+    try:
+        value = literal_eval(value)
+    except ValueError:
+        pass
+    except SyntaxError:
+        pass
+    return value
+
+
+def decode_all(decode_fn, values):
+    for v in values:
+        decode_fn(v)
+
+
+def main():
+    values = OVERRIDE_VALUES * 100
+    print_header("values", "legacy (s)", "current (s)", "speedup", "hit rate")
+    CN.clear_decode_cache()
+    t_old = best_time(lambda: decode_all(legacy_decode, values))
+    t_new = best_time(lambda: decode_all(CN._decode_cfg_value, values))
+    info = CN.decode_cache_info()
+    hit_rate = info["hits"] / float(info["hits"] + info["misses"])
+    print_row(len(values), t_old, t_new, t_old / t_new, hit_rate)
+
+
+if __name__ == "__main__":
+    main()
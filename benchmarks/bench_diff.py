@@ -0,0 +1,47 @@
+"""Benchmark CfgNode.diff on two nearly identical configs (one changed leaf)
+against a text diff of their YAML dumps.
+
+`full walk` compares two independent copies, `fingerprints` two frozen copies
+whose fingerprints are memoized, and `cow clone` a config with a copy-on-write
+clone of it, whose unchanged sub-configs are shared.
+"""
+
+import difflib
+
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def text_diff(a, b):
+    return list(difflib.unified_diff(a.dump().splitlines(), b.dump().splitlines()))
+
+
+def changed_copy(cfg):
+    other = cfg.clone()
+    other.defrost()
+    other.NODE_0.NODE_1.NODE_2.LEAF_0 = -1
+    other.freeze()
+    return other
+
+
+def main():
+    print_header("leaves", "method", "time (s)")
+    for depth, width in [(4, 4), (6, 4)]:
+        cfg = CN(make_cfg_dict(depth, width))
+        cfg.freeze()
+        other = changed_copy(cfg)
+        leaves = count_leaves(cfg)
+        print_row(leaves, "text diff", best_time(lambda: text_diff(cfg, other), 3))
+        print_row(leaves, "full walk", best_time(lambda: cfg.diff(other)))
+        cfg.fingerprint()
+        other.fingerprint()
+        print_row(leaves, "fingerprints", best_time(lambda: cfg.diff(other)))
+        clone = cfg.clone(copy_on_write=True)
+        clone.defrost()
+        clone.NODE_0.NODE_1.NODE_2.LEAF_0 = -1
+        clone.freeze()
+        print_row(leaves, "cow clone", best_time(lambda: cfg.diff(clone)))
+
+
+if __name__ == "__main__":
+    main()
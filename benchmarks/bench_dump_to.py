@@ -0,0 +1,49 @@
+"""Benchmark writing a config with large list values to a file with dump() and
+with dump_to(): time and peak memory.
+"""
+
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from common import best_time, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def write_dump(cfg, filename):
+    with open(filename, "w") as f:
+        f.write(cfg.dump())
+
+
+def write_dump_to(cfg, filename):
+    with open(filename, "w") as f:
+        cfg.dump_to(f)
+
+
+def peak_memory_mb(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    filename = os.path.join(tmp_dir, "cfg.yaml")
+    print_header("list size", "method", "time (s)", "peak (MB)")
+    for list_size in [1000, 10000, 100000]:
+        cfg = CN(make_cfg_dict(4, 3))
+        # E.g., class maps and per-layer schedules
+        cfg.CLASS_NAMES = ["class_{}".format(i) for i in range(list_size)]
+        cfg.SCHEDULE = [0.1 * i for i in range(list_size)]
+        for name, fn in [("dump", write_dump), ("dump_to", write_dump_to)]:
+            t = best_time(lambda: fn(cfg, filename), 3)
+            peak = peak_memory_mb(lambda: fn(cfg, filename))
+            print_row(list_size, name, t, peak)
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Benchmark CfgNode.fingerprint against hashing the output of dump(): the first
+fingerprint of a frozen config, a memoized one, and one after changing a single
+key of a sub-config (defrost, set, freeze the sub-config), which only hashes that
+sub-config and the root again.
+"""
+
+import hashlib
+
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def hash_dump(cfg):
+    return hashlib.sha1(cfg.dump().encode("utf-8")).hexdigest()
+
+
+def first_fingerprint(cfg):
+    # Invalidate the memoized fingerprints
+    cfg.defrost()
+    cfg.freeze()
+    return cfg.fingerprint()
+
+
+def change_and_fingerprint(cfg):
+    cfg.NODE_0.defrost()
+    cfg.NODE_0.LEAF_0 += 1
+    cfg.NODE_0.freeze()
+    return cfg.fingerprint()
+
+
+def main():
+    print_header("leaves", "hash dump (s)", "first (s)", "memoized (s)", "changed (s)")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg = CN(make_cfg_dict(depth, width))
+        cfg.freeze()
+        t_dump = best_time(lambda: hash_dump(cfg), 3)
+        t_first = best_time(lambda: first_fingerprint(cfg), 3)
+        cfg.fingerprint()
+        t_memo = best_time(lambda: cfg.fingerprint(), number=1000)
+        t_changed = best_time(lambda: change_and_fingerprint(cfg), 3)
+        print_row(count_leaves(cfg), t_dump, t_first, t_memo, t_changed)
+
+
+if __name__ == "__main__":
+    main()
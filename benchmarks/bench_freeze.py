@@ -0,0 +1,39 @@
+"""Benchmark freeze()/defrost() as the config grows.
+
+`walk_all_nodes` visits every CfgNode the way the previous recursive freeze()
+did, as a reference for the cost of a full tree walk.
+"""
+
+from common import best_time, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def walk_all_nodes(cfg):
+    for v in cfg.__dict__.values():
+        if isinstance(v, CN):
+            walk_all_nodes(v)
+    for v in cfg.values():
+        if isinstance(v, CN):
+            walk_all_nodes(v)
+
+
+def count_nodes(cfg):
+    return 1 + sum(count_nodes(v) for v in cfg.values() if isinstance(v, CN))
+
+
+def freeze_defrost(cfg):
+    cfg.freeze()
+    cfg.defrost()
+
+
+def main():
+    print_header("depth", "width", "nodes", "walk (s)", "freeze+defrost (s)")
+    for depth, width in [(2, 8), (4, 4), (6, 3), (8, 2), (10, 2)]:
+        cfg = CN(make_cfg_dict(depth, width))
+        t_walk = best_time(lambda: walk_all_nodes(cfg), number=10)
+        t_freeze = best_time(lambda: freeze_defrost(cfg), number=1000)
+        print_row(depth, width, count_nodes(cfg), t_walk, t_freeze)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Benchmark CfgNode.to_frozen_struct: converting a frozen config to records (with
+the record types generated, then cached) and reading a nested key from them,
+compared to a plain dict, a CfgNode and a view (see CfgNode.view).
+"""
+
+import yacs.config
+from bench_getattr import read_attrs, read_dict
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def generate_struct(cfg):
+    yacs.config._frozen_struct_types.clear()
+    return cfg.to_frozen_struct()
+
+
+def main():
+    print_header("leaves", "generate (s)", "cached (s)", "back (s)")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg = CN(make_cfg_dict(depth, width))
+        cfg.freeze()
+        t_generate = best_time(lambda: generate_struct(cfg), 3)
+        t_cached = best_time(lambda: cfg.to_frozen_struct(), 3)
+        struct = cfg.to_frozen_struct()
+        t_back = best_time(lambda: CN.from_frozen_struct(struct), 3)
+        print_row(count_leaves(cfg), t_generate, t_cached, t_back)
+
+    print("")
+    d = make_cfg_dict(4, 4)
+    cfg = CN(d)
+    cfg.freeze()
+    view = cfg.view()
+    struct = cfg.to_frozen_struct()
+    t_dict = best_time(lambda: read_dict(d))
+    print_header("access", "time (s)", "vs dict")
+    for name, fn in [
+        ("dict", lambda: read_dict(d)),
+        ("cfg.key", lambda: read_attrs(cfg)),
+        ("view.key", lambda: read_attrs(view)),
+        ("struct.key", lambda: read_attrs(struct)),
+    ]:
+        t = best_time(fn)
+        print_row(name, t, t / t_dict)
+
+
+if __name__ == "__main__":
+    main()
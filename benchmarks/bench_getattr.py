@@ -0,0 +1,59 @@
+"""Microbenchmark of reading a nested key (`cfg.NODE_0.NODE_1.LEAF_0`) in a hot
+loop: plain dict access, CfgNode item and attribute access, and a view (see
+CfgNode.view).
+
+`LegacyCfgNode` reproduces the previous CfgNode.__getattr__, which looked the
+key up twice, for comparison.
+"""
+
+from common import best_time, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+NUM_READS = 100000
+
+
+class LegacyCfgNode(CN):
+    def __getattr__(self, name):
+        if name in self:
+            return self[name]
+        else:
+            raise AttributeError(name)
+
+
+def read_dict(d):
+    for _ in range(NUM_READS):
+        d["NODE_0"]["NODE_1"]["LEAF_0"]
+
+
+def read_items(cfg):
+    for _ in range(NUM_READS):
+        cfg["NODE_0"]["NODE_1"]["LEAF_0"]
+
+
+def read_attrs(cfg):
+    for _ in range(NUM_READS):
+        cfg.NODE_0.NODE_1.LEAF_0
+
+
+def main():
+    d = make_cfg_dict(4, 4)
+    cfg = CN(d)
+    cfg.freeze()
+    legacy_cfg = LegacyCfgNode(d)
+    legacy_cfg.freeze()
+    view = cfg.view()
+    t_dict = best_time(lambda: read_dict(d))
+    print_header("access", "time (s)", "vs dict")
+    for name, fn in [
+        ("dict", lambda: read_dict(d)),
+        ("cfg[key]", lambda: read_items(cfg)),
+        ("legacy cfg.key", lambda: read_attrs(legacy_cfg)),
+        ("cfg.key", lambda: read_attrs(cfg)),
+        ("view.key", lambda: read_attrs(view)),
+    ]:
+        t = best_time(fn)
+        print_row(name, t, t / t_dict)
+
+
+if __name__ == "__main__":
+    main()
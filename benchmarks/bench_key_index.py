@@ -0,0 +1,40 @@
+"""Benchmark dotted-key lookups with and without the key index.
+
+Measures merge_from_list with many overrides and get_by_path reads of deep keys.
+"""
+
+from common import best_time, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def leaf_keys(d, prefix=""):
+    keys = []
+    for k, v in sorted(d.items()):
+        if isinstance(v, dict):
+            keys.extend(leaf_keys(v, prefix + k + "."))
+        elif isinstance(v, int) and not isinstance(v, bool):
+            keys.append(prefix + k)
+    return keys
+
+
+def main():
+    depth, width = 8, 2
+    cfg_dict = make_cfg_dict(depth, width)
+    # The deepest keys are the most expensive to walk
+    keys = sorted(leaf_keys(cfg_dict), key=lambda k: -k.count("."))
+    print_header("overrides", "mode", "merge (s)", "get (s)")
+    for num_overrides in [10, 100, 500]:
+        opts = []
+        for i, k in enumerate(keys[:num_overrides]):
+            opts += [k, i]
+        for indexed in (False, True):
+            cfg = CN(cfg_dict)
+            cfg.set_key_index_enabled(indexed)
+            t_merge = best_time(lambda: cfg.merge_from_list(opts))
+            t_get = best_time(lambda: [cfg.get_by_path(k) for k in opts[0::2]])
+            mode = "index" if indexed else "walk"
+            print_row(num_overrides, mode, t_merge, t_get)
+
+
+if __name__ == "__main__":
+    main()
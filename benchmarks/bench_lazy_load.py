@@ -0,0 +1,39 @@
+"""Benchmark loading a large YAML config eagerly and lazily (load_cfg(lazy=True)),
+then reading a few keys: time and memory held by the loaded config.
+"""
+
+import tracemalloc
+
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def load_and_read(yaml_str, lazy):
+    cfg = CN.load_cfg(yaml_str, lazy=lazy)
+    # A serving process only reads a few keys
+    _ = cfg.NODE_0.NODE_1.LEAF_0, cfg.NODE_1.LEAF_2, cfg.LEAF_3
+    return cfg
+
+
+def held_memory_mb(fn):
+    tracemalloc.start()
+    result = fn()  # noqa: F841
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / 1e6
+
+
+def main():
+    print_header("leaves", "mode", "load+read (s)", "memory (MB)")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg_dict = make_cfg_dict(depth, width)
+        yaml_str = CN(cfg_dict).dump()
+        for lazy in (False, True):
+            t = best_time(lambda: load_and_read(yaml_str, lazy), 3)
+            memory = held_memory_mb(lambda: load_and_read(yaml_str, lazy))
+            mode = "lazy" if lazy else "eager"
+            print_row(count_leaves(cfg_dict), mode, t, memory)
+
+
+if __name__ == "__main__":
+    main()
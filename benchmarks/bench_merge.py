@@ -0,0 +1,51 @@
+"""Benchmark merging layered override configs into a large config.
+
+`legacy_merge_a_into_b` reproduces the previous merge, which deep-copied and
+decoded every value of `a` before recursing, for comparison.
+"""
+
+import copy
+
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+from yacs.config import _check_and_coerce_cfg_value_type, _merge_a_into_b
+
+
+def legacy_merge_a_into_b(a, b, root, key_list):
+    for k, v_ in a.items():
+        full_key = ".".join(key_list + [k])
+        v = copy.deepcopy(v_)
+        v = b._decode_cfg_value(v)
+        if k in b:
+            v = _check_and_coerce_cfg_value_type(v, b[k], k, full_key)
+            if isinstance(v, CN):
+                legacy_merge_a_into_b(v, b[k], root, key_list + [k])
+            else:
+                b[k] = v
+        elif b.is_new_allowed():
+            b[k] = v
+        else:
+            raise KeyError("Non-existent config key: {}".format(full_key))
+
+
+def merge_layers(merge_fn, base, layers):
+    cfg = base.clone()
+    for layer in layers:
+        merge_fn(layer, cfg, cfg, [])
+
+
+def main():
+    num_layers = 10
+    print_header("depth", "width", "leaves", "legacy (s)", "current (s)", "speedup")
+    for depth, width in [(4, 4), (6, 3), (8, 2), (10, 2)]:
+        cfg_dict = make_cfg_dict(depth, width)
+        base = CN(cfg_dict)
+        # Full-tree overrides are the worst case for the merge
+        layers = [CN(cfg_dict) for _ in range(num_layers)]
+        t_old = best_time(lambda: merge_layers(legacy_merge_a_into_b, base, layers), 3)
+        t_new = best_time(lambda: merge_layers(_merge_a_into_b, base, layers), 3)
+        print_row(depth, width, count_leaves(cfg_dict), t_old, t_new, t_old / t_new)
+
+
+if __name__ == "__main__":
+    main()
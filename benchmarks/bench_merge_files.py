@@ -0,0 +1,69 @@
+"""Benchmark merging many config fragment files with merge_from_file one after
+another and with merge_from_files: with its defaults (one process per CPU, or
+sequential loading on a single CPU or for small files), and with 4 threads or 4
+processes regardless of the file sizes.
+"""
+
+import os
+import shutil
+import tempfile
+
+import yacs.config
+from common import best_time, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def write_fragments(tmp_dir, num_fragments):
+    filenames = []
+    for i in range(num_fragments):
+        fragment = CN({"DATASETS": {"DATASET_{}".format(i): make_cfg_dict(3, 3)}})
+        filenames.append(os.path.join(tmp_dir, "dataset_{}.yaml".format(i)))
+        with open(filenames[-1], "w") as f:
+            f.write(fragment.dump())
+    return filenames
+
+
+def make_base_cfg():
+    cfg = CN()
+    cfg.DATASETS = CN(new_allowed=True)
+    return cfg
+
+
+def merge_sequentially(filenames):
+    cfg = make_base_cfg()
+    for filename in filenames:
+        cfg.merge_from_file(filename)
+
+
+def merge_with_defaults(filenames):
+    cfg = make_base_cfg()
+    cfg.merge_from_files(filenames)
+
+
+def merge_concurrently(filenames, use_processes):
+    cfg = make_base_cfg()
+    min_pool_bytes = yacs.config._MIN_POOL_BYTES
+    yacs.config._MIN_POOL_BYTES = 0
+    try:
+        cfg.merge_from_files(filenames, workers=4, use_processes=use_processes)
+    finally:
+        yacs.config._MIN_POOL_BYTES = min_pool_bytes
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    print_header(
+        "fragments", "sequential (s)", "defaults (s)", "threads (s)", "processes (s)"
+    )
+    for num_fragments in [8, 32, 128]:
+        filenames = write_fragments(tmp_dir, num_fragments)
+        t_seq = best_time(lambda: merge_sequentially(filenames), 3)
+        t_defaults = best_time(lambda: merge_with_defaults(filenames), 3)
+        t_threads = best_time(lambda: merge_concurrently(filenames, False), 3)
+        t_procs = best_time(lambda: merge_concurrently(filenames, True), 3)
+        print_row(num_fragments, t_seq, t_defaults, t_threads, t_procs)
+    shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
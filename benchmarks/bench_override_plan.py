@@ -0,0 +1,39 @@
+"""Benchmark the overrides of a sweep: merge_from_list against a compiled
+override plan (CfgNode.compile_overrides). Clones are made outside of the timings.
+"""
+
+from bench_key_index import leaf_keys
+from common import best_time, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def sweep_merge_from_list(clones, keys, sweep_values):
+    for cfg, values in zip(clones, sweep_values):
+        opts = []
+        for k, v in zip(keys, values):
+            opts += [k, v]
+        cfg.merge_from_list(opts)
+
+
+def sweep_plan(clones, plan, sweep_values):
+    for cfg, values in zip(clones, sweep_values):
+        plan.apply(cfg, values)
+
+
+def main():
+    cfg_dict = make_cfg_dict(6, 3)
+    cfg = CN(cfg_dict)
+    all_keys = sorted(leaf_keys(cfg_dict), key=lambda k: -k.count("."))
+    print_header("overrides", "runs", "merge_from_list (s)", "plan (s)", "speedup")
+    for num_overrides in [5, 20, 100]:
+        keys = all_keys[:num_overrides]
+        sweep_values = [[i + j for j in range(num_overrides)] for i in range(200)]
+        plan = cfg.compile_overrides(keys)
+        clones = [cfg.clone() for _ in sweep_values]
+        t_merge = best_time(lambda: sweep_merge_from_list(clones, keys, sweep_values))
+        t_plan = best_time(lambda: sweep_plan(clones, plan, sweep_values))
+        print_row(num_overrides, len(sweep_values), t_merge, t_plan, t_merge / t_plan)
+
+
+if __name__ == "__main__":
+    main()
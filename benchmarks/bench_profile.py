@@ -0,0 +1,54 @@
+"""Benchmark the overhead of profiling (see yacs.config.enable_profiling) on reading
+a nested key in a hot loop and on loading, merging, cloning and dumping a config.
+
+`off` is measured before profiling is ever enabled, `disabled` after it was
+enabled then disabled again, `timings` with only the timing counters and `reads`
+with the per-key read counters as well.
+"""
+
+from common import best_time, make_cfg_dict, print_header, print_row
+import yacs.config
+from yacs.config import CfgNode as CN
+
+NUM_READS = 100000
+
+
+def read_attrs(cfg):
+    for _ in range(NUM_READS):
+        cfg.NODE_0.NODE_1.LEAF_0
+
+
+def load_merge_clone_dump(cfg_str, cfg_list):
+    cfg = CN.load_cfg(cfg_str)
+    cfg.merge_from_list(cfg_list)
+    cfg.merge_from_other_cfg(cfg.clone())
+    cfg.dump()
+
+
+def time_all(cfg, cfg_str, cfg_list):
+    t_reads = best_time(lambda: read_attrs(cfg))
+    t_ops = best_time(lambda: load_merge_clone_dump(cfg_str, cfg_list), 3)
+    return t_reads, t_ops
+
+
+def main():
+    cfg = CN(make_cfg_dict(4, 4))
+    cfg.freeze()
+    cfg_str = cfg.dump()
+    cfg_list = ["NODE_0.NODE_1.LEAF_0", "2", "NODE_1.LEAF_2", "a/file"]
+    time_all(cfg, cfg_str, cfg_list)  # warm up
+    print_header("profiling", "reads (s)", "ops (s)")
+    t_off = time_all(cfg, cfg_str, cfg_list)
+    print_row("off", *t_off)
+    yacs.config.enable_profiling(key_reads=False)
+    print_row("timings", *time_all(cfg, cfg_str, cfg_list))
+    yacs.config.enable_profiling()
+    t_on = time_all(cfg, cfg_str, cfg_list)
+    print_row("reads", *t_on)
+    yacs.config.disable_profiling()
+    print_row("disabled", *time_all(cfg, cfg_str, cfg_list))
+    print_row("overhead", t_on[0] / t_off[0], t_on[1] / t_off[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark handing a frozen config to worker processes: pickling a copy to each
+worker against attaching to a config published with CfgNode.publish_shared.
+
+Each worker reports the time to get its config, the time to then read every leaf
+and the growth of its private memory (from /proc/self/smaps_rollup, so Linux
+only) after reading every leaf.
+"""
+
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+
+from common import make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN, unlink_shared
+
+NUM_WORKERS = 4
+
+
+def private_kb():
+    total = 0
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total
+
+
+def read_all_leaves(cfg):
+    n = 0
+    for v in cfg.values():
+        n += read_all_leaves(v) if hasattr(v, "items") else 1
+    return n
+
+
+def worker(mode, source, results):
+    mem = private_kb()
+    start = time.time()
+    if mode == "pickle":
+        with open(source, "rb") as f:
+            cfg = pickle.loads(f.read())
+    else:
+        cfg = CN.attach_shared(source)
+    t_get = time.time() - start
+    start = time.time()
+    read_all_leaves(cfg)
+    t_read = time.time() - start
+    results.put((t_get, t_read, private_kb() - mem))
+
+
+def run_workers(mode, source):
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=worker, args=(mode, source, results))
+        for _ in range(NUM_WORKERS)
+    ]
+    for p in procs:
+        p.start()
+    stats = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return [sum(s[i] for s in stats) / len(stats) for i in range(3)]
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    pickle_file = os.path.join(tmp_dir, "cfg.pkl")
+    print_header("leaves", "method", "get cfg (s)", "read all (s)", "private (KB)")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg = CN(make_cfg_dict(depth, width))
+        cfg.freeze()
+        leaves = read_all_leaves(cfg)
+        with open(pickle_file, "wb") as f:
+            pickle.dump(cfg, f, pickle.HIGHEST_PROTOCOL)
+        print_row(leaves, "pickle", *run_workers("pickle", pickle_file))
+        name = "bench-{}".format(os.getpid())
+        cfg.publish_shared(name)
+        # Keep the published pages mapped, as the process publishing a config would
+        CN.attach_shared(name)
+        print_row(leaves, "shared", *run_workers("shared", name))
+        unlink_shared(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Benchmark binary snapshots against the YAML round trip (dump + load_cfg)."""
+
+import os
+import tempfile
+
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def yaml_load(filename):
+    with open(filename, "r") as f:
+        return CN.load_cfg(f)
+
+
+def yaml_round_trip(cfg, filename):
+    with open(filename, "w") as f:
+        f.write(cfg.dump())
+    return yaml_load(filename)
+
+
+def snapshot_round_trip(cfg, filename):
+    cfg.save_snapshot(filename)
+    return CN.load_snapshot(filename)
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    yaml_file = os.path.join(tmp_dir, "cfg.yaml")
+    snapshot_file = os.path.join(tmp_dir, "cfg.snap")
+    print_header("leaves", "format", "save+load (s)", "load (s)", "size (KB)")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg = CN(make_cfg_dict(depth, width))
+        leaves = count_leaves(cfg)
+        t = best_time(lambda: yaml_round_trip(cfg, yaml_file), 3)
+        t_load = best_time(lambda: yaml_load(yaml_file), 3)
+        print_row(leaves, "yaml", t, t_load, os.path.getsize(yaml_file) / 1024.0)
+        t = best_time(lambda: snapshot_round_trip(cfg, snapshot_file), 3)
+        t_load = best_time(lambda: CN.load_snapshot(snapshot_file), 3)
+        size = os.path.getsize(snapshot_file) / 1024.0
+        print_row(leaves, "snapshot", t, t_load, size)
+
+
+if __name__ == "__main__":
+    main()
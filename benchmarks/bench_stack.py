@@ -0,0 +1,46 @@
+"""Benchmark changing the top layer of a CfgStack against cloning the defaults
+and replaying every merge.
+
+The stack is defaults, a base config overriding one top level sub-config, an
+experiment config overriding another one, then a command line override list.
+"""
+
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN, CfgStack
+
+
+def make_layers(defaults, cli_value):
+    base = CN({"NODE_0": defaults.NODE_0.clone()})
+    base.NODE_0.LEAF_0 = 2
+    experiment = CN({"NODE_1": defaults.NODE_1.clone()})
+    experiment.NODE_1.LEAF_0 = 3
+    cli = ["NODE_0.NODE_1.LEAF_0", str(cli_value)]
+    return base, experiment, cli
+
+
+def replay(defaults, base, experiment, cli):
+    cfg = defaults.clone()
+    cfg.merge_from_other_cfg(base)
+    cfg.merge_from_other_cfg(experiment)
+    cfg.merge_from_list(cli)
+    cfg.freeze()
+    return cfg
+
+
+def main():
+    print_header("leaves", "replay (s)", "stack (s)")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        defaults = CN(make_cfg_dict(depth, width))
+        base, experiment, cli = make_layers(defaults, 4)
+        stack = CfgStack(defaults)
+        stack.push("base", base)
+        stack.push("experiment", experiment)
+        stack.push("cli", cli)
+        assert stack.get() == replay(defaults, base, experiment, cli)
+        t_replay = best_time(lambda: replay(defaults, base, experiment, cli))
+        t_stack = best_time(lambda: stack.set_layer("cli", cli), number=10)
+        print_row(count_leaves(defaults), t_replay, t_stack)
+
+
+if __name__ == "__main__":
+    main()
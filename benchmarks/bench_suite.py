@@ -0,0 +1,226 @@
+"""Benchmark suite of the core yacs operations on a synthetic config, reporting the
+best time and the peak memory allocated (with tracemalloc, on Python 3) of each.
+
+The results can be saved as JSON and compared with those of another run, e.g.:
+
+    python benchmarks/bench_suite.py --json before.json
+    (change yacs)
+    python benchmarks/bench_suite.py --compare before.json
+
+Run with --help for the options of the config generator (see make_cfg_dict).
+"""
+
+import argparse
+import collections
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import yaml
+from common import LEAF_TYPES, best_time, count_leaves, make_cfg_dict
+from common import print_header, print_row
+from yacs.config import CfgNode as CN
+from yacs.config import get_yaml_backend
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2: only times are reported
+    tracemalloc = None
+
+
+def get_leaf_keys(cfg, key_list=()):
+    """Return the key lists of the leaves of `cfg`."""
+    leaf_keys = []
+    for k, v in cfg.items():
+        if isinstance(v, CN):
+            leaf_keys.extend(get_leaf_keys(v, key_list + (k,)))
+        else:
+            leaf_keys.append(key_list + (k,))
+    return leaf_keys
+
+
+def get_override_list(cfg, leaf_keys, num_overrides):
+    """Return a merge_from_list override list that sets `num_overrides` leaves to
+    their current values.
+    """
+    cfg_list = []
+    for key_list in leaf_keys[:num_overrides]:
+        value = cfg
+        for k in key_list:
+            value = value[k]
+        cfg_list.extend([".".join(key_list), repr(value)])
+    return cfg_list
+
+
+def read_leaves(cfg, leaf_keys):
+    for key_list in leaf_keys:
+        value = cfg
+        for k in key_list:
+            value = getattr(value, k)
+
+
+def freeze_defrost(cfg):
+    cfg.freeze()
+    cfg.defrost()
+
+
+def load_cfg_file(filename):
+    with open(filename, "r") as f:
+        return CN.load_cfg(f)
+
+
+def make_cases(cfg_dict, num_overrides, tmp_dir):
+    """Return the benchmarked functions by name."""
+    cfg = CN(cfg_dict)
+    leaf_keys = get_leaf_keys(cfg)
+    cfg_list = get_override_list(cfg, leaf_keys, num_overrides)
+    yaml_filename = os.path.join(tmp_dir, "cfg.yaml")
+    with open(yaml_filename, "w") as f:
+        f.write(cfg.dump())
+    py_filename = os.path.join(tmp_dir, "cfg.py")
+    with open(py_filename, "w") as f:
+        f.write("cfg = {!r}\n".format(cfg_dict))
+    merged = cfg.clone()
+    return collections.OrderedDict(
+        [
+            ("construct", lambda: CN(cfg_dict)),
+            ("load_cfg_yaml", lambda: load_cfg_file(yaml_filename)),
+            ("load_cfg_py", lambda: load_cfg_file(py_filename)),
+            ("merge_from_file", lambda: merged.merge_from_file(yaml_filename)),
+            ("merge_from_list", lambda: merged.merge_from_list(cfg_list)),
+            ("clone", lambda: cfg.clone()),
+            ("freeze_defrost", lambda: freeze_defrost(cfg)),
+            ("dump", lambda: cfg.dump()),
+            ("str", lambda: str(cfg)),
+            ("getattr", lambda: read_leaves(cfg, leaf_keys)),
+        ]
+    )
+
+
+def measure(fn, repeat):
+    """Return the best time of `fn` and the peak memory allocated by one call."""
+    result = collections.OrderedDict([("seconds", best_time(fn, repeat))])
+    if tracemalloc is not None:
+        # Separate run, as tracing slows allocations down
+        tracemalloc.start()
+        try:
+            fn()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def get_environment():
+    return collections.OrderedDict(
+        [
+            ("python", platform.python_version()),
+            ("implementation", platform.python_implementation()),
+            ("platform", platform.platform()),
+            ("pyyaml", yaml.__version__),
+            ("libyaml", yaml.__with_libyaml__),
+            ("yaml_backend", get_yaml_backend()),
+            ("date", time.strftime("%Y-%m-%dT%H:%M:%S")),
+        ]
+    )
+
+
+def print_results(results, baseline):
+    columns = ["case", "time (s)", "peak (KiB)"]
+    if baseline is not None:
+        columns.extend(["time ratio", "peak ratio"])
+    print_header(*columns)
+    for name, result in results.items():
+        peak = result.get("peak_bytes")
+        row = [name, result["seconds"], "-" if peak is None else peak // 1024]
+        if baseline is not None:
+            old = baseline.get(name, {})
+            for key in ["seconds", "peak_bytes"]:
+                if old.get(key) and result.get(key) is not None:
+                    row.append(float(result[key]) / old[key])
+                else:
+                    row.append("-")
+        print_row(*row)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--width", type=int, default=4)
+    parser.add_argument("--num-leaves", type=int, default=8, help="per node")
+    parser.add_argument(
+        "--leaf-types",
+        default=",".join(LEAF_TYPES),
+        help="comma separated list of: {}".format(", ".join(LEAF_TYPES)),
+    )
+    parser.add_argument("--list-size", type=int, default=3)
+    parser.add_argument("--num-overrides", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--cases", help="comma separated list of cases to run (default: all)"
+    )
+    parser.add_argument("--json", help="save the results as JSON (- for stdout)")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    args = parser.parse_args()
+    args.leaf_types = args.leaf_types.split(",")
+    for leaf_type in args.leaf_types:
+        if leaf_type not in LEAF_TYPES:
+            parser.error("unknown leaf type: {}".format(leaf_type))
+    return args
+
+
+def main():
+    args = parse_args()
+    cfg_dict = make_cfg_dict(
+        args.depth, args.width, args.num_leaves, args.leaf_types, args.list_size
+    )
+    params = collections.OrderedDict(
+        [
+            ("depth", args.depth),
+            ("width", args.width),
+            ("num_leaves", args.num_leaves),
+            ("leaf_types", args.leaf_types),
+            ("list_size", args.list_size),
+            ("num_overrides", args.num_overrides),
+            ("leaves", count_leaves(cfg_dict)),
+        ]
+    )
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        cases = make_cases(cfg_dict, args.num_overrides, tmp_dir)
+        names = args.cases.split(",") if args.cases else list(cases)
+        for name in names:
+            if name not in cases:
+                raise ValueError("Unknown case {}; cases: {}".format(name, list(cases)))
+        results = collections.OrderedDict()
+        for name in names:
+            results[name] = measure(cases[name], args.repeat)
+    finally:
+        shutil.rmtree(tmp_dir)
+    report = collections.OrderedDict(
+        [("environment", get_environment()), ("config", params), ("results", results)]
+    )
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if baseline["config"] != params:
+            print("Warning: the compared run used another config generator setup")
+        baseline = baseline["results"]
+    print_results(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Benchmark generating (and keeping) the configs of a grid sweep: loops of
+clone() + merge_from_list against CfgNode.sweep, which shares untouched subtrees.
+"""
+
+import itertools
+import tracemalloc
+
+from common import best_time, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+SWEPT_KEYS = [
+    "NODE_0.NODE_0.LEAF_0",
+    "NODE_0.NODE_1.LEAF_0",
+    "NODE_1.LEAF_0",
+    "NODE_2.NODE_2.NODE_2.LEAF_0",
+]
+
+
+def clone_and_merge(cfg, space):
+    configs = []
+    for values in itertools.product(*[space[k] for k in SWEPT_KEYS]):
+        c = cfg.clone()
+        c.merge_from_list(list(itertools.chain(*zip(SWEPT_KEYS, values))))
+        configs.append(c)
+    return configs
+
+
+def sweep(cfg, space):
+    return [c for _, c in cfg.sweep([(k, space[k]) for k in SWEPT_KEYS])]
+
+
+def peak_memory_mb(fn):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def main():
+    cfg = CN(make_cfg_dict(4, 3))
+    print_header("configs", "method", "time (s)", "peak (MB)")
+    for n in [3, 5, 7]:
+        space = {k: list(range(n)) for k in SWEPT_KEYS}
+        for name, fn in [("clone+merge", clone_and_merge), ("sweep", sweep)]:
+            t = best_time(lambda: fn(cfg, space), 1)
+            peak = peak_memory_mb(lambda: fn(cfg, space))
+            print_row(n ** len(SWEPT_KEYS), name, t, peak)
+
+
+if __name__ == "__main__":
+    main()
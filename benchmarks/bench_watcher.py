@@ -0,0 +1,62 @@
+"""Benchmark CfgWatcher reloads against loading the config again from scratch
+(`merge_from_file` on every file), when one of the files changes.
+
+The config is a base config with a stack of files merged into it, each of which
+overrides every leaf of one top level sub-config.
+"""
+
+import os
+import tempfile
+import time
+
+from common import best_time, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN, CfgWatcher
+
+NUM_FILES = 8
+
+
+def full_reload(base, filenames):
+    cfg = base.clone()
+    for filename in filenames:
+        cfg.merge_from_file(filename)
+    cfg.freeze()
+    return cfg
+
+
+def write_layer(filename, base, i, value):
+    layer = CN({"NODE_{}".format(i): base["NODE_{}".format(i)].clone()})
+    layer["NODE_{}".format(i)].LEAF_0 = value
+    with open(filename, "w") as f:
+        f.write(layer.dump())
+
+
+def time_reload(watcher, filename, base, i, repeat=3):
+    """Return the best time of watcher.check() after changing `filename`."""
+    times = []
+    for _ in range(repeat):
+        write_layer(filename, base, i, -watcher.get()["NODE_{}".format(i)].LEAF_0)
+        # Make sure the change is seen even when the mtime is unchanged
+        st = os.stat(filename)
+        os.utime(filename, (st.st_atime, st.st_mtime + 1))
+        start = time.time()
+        assert watcher.check()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    base = CN(make_cfg_dict(3, NUM_FILES))
+    filenames = []
+    for i in range(NUM_FILES):
+        filenames.append(os.path.join(tmp_dir, "layer_{}.yaml".format(i)))
+        write_layer(filenames[-1], base, i, i)
+    watcher = CfgWatcher(base, filenames, debounce=0)
+    print_header("changed file", "full (s)", "watcher (s)")
+    for i in [0, NUM_FILES // 2, NUM_FILES - 1]:
+        t_full = best_time(lambda: full_reload(base, filenames), 3)
+        print_row(i, t_full, time_reload(watcher, filenames[i], base, i))
+
+
+if __name__ == "__main__":
+    main()
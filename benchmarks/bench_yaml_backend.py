@@ -0,0 +1,24 @@
+"""Benchmark load_cfg and dump with the pure Python and libyaml YAML backends."""
+
+import yacs.config
+from common import best_time, count_leaves, make_cfg_dict, print_header, print_row
+from yacs.config import CfgNode as CN
+
+
+def main():
+    print_header("leaves", "backend", "load (s)", "dump (s)", "load MB/s")
+    for depth, width in [(4, 4), (6, 3), (10, 2)]:
+        cfg = CN(make_cfg_dict(depth, width))
+        leaves = count_leaves(cfg)
+        yaml_str = cfg.dump()
+        megabytes = len(yaml_str) / 1e6
+        for backend in ("python", "auto"):
+            yacs.config.set_yaml_backend(backend)
+            t_load = best_time(lambda: CN.load_cfg(yaml_str), 3)
+            t_dump = best_time(lambda: cfg.dump(), 3)
+            print_row(leaves, backend, t_load, t_dump, megabytes / t_load)
+        yacs.config.set_yaml_backend("auto")
+
+
+if __name__ == "__main__":
+    main()
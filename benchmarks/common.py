@@ -0,0 +1,72 @@
+"""Shared helpers for the yacs benchmarks.
+
+The benchmarks are plain scripts; run them from the repository root with yacs
+importable, e.g.:
+
+    pip install -e .
+    python benchmarks/bench_construct.py
+
+benchmarks/bench_suite.py times the core operations and reports the results as
+JSON, to compare runs; the other scripts compare an optimization with the code it
+replaced.
+"""
+
+import collections
+import timeit
+
+# Leaf types of the synthetic configs, by name, as functions of the list size
+LEAF_TYPES = collections.OrderedDict(
+    [
+        ("int", lambda n: 1),
+        ("float", lambda n: 0.5),
+        ("str", lambda n: "some/path/to/a/file"),
+        ("tuple", lambda n: tuple(range(1, n + 1))),
+        ("list", lambda n: list(range(1, n + 1))),
+        ("bool", lambda n: True),
+        ("none", lambda n: None),
+    ]
+)
+
+
+def make_cfg_dict(depth, width, num_leaves=4, leaf_types=None, list_size=3):
+    """Build a synthetic nested config dict.
+
+    Every internal node has `width` child nodes (until `depth` is reached) and
+    `num_leaves` leaves that cycle through `leaf_types` (names of LEAF_TYPES, all of
+    them by default). Tuple and list leaves have `list_size` items.
+    """
+    if leaf_types is None:
+        leaf_types = list(LEAF_TYPES)
+    leaf_values = [LEAF_TYPES[t](list_size) for t in leaf_types]
+    node = {}
+    for i in range(num_leaves):
+        node["LEAF_{}".format(i)] = leaf_values[i % len(leaf_values)]
+    if depth > 0:
+        for i in range(width):
+            node["NODE_{}".format(i)] = make_cfg_dict(
+                depth - 1, width, num_leaves, leaf_types, list_size
+            )
+    return node
+
+
+def count_leaves(d):
+    return sum(count_leaves(v) if isinstance(v, dict) else 1 for v in d.values())
+
+
+def best_time(fn, repeat=5, number=1):
+    """Return the best wall time (in seconds) of `number` calls to `fn`."""
+    return min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+
+
+def print_header(*columns):
+    print(" ".join("{:>14}".format(c) for c in columns))
+
+
+def print_row(*values):
+    cells = []
+    for v in values:
+        if isinstance(v, float):
+            cells.append("{:>14.6f}".format(v))
+        else:
+            cells.append("{:>14}".format(v))
+    print(" ".join(cells))
@@ -20,15 +20,39 @@ projects.
 See README.md for usage and examples.
 """
 
+import collections
 import copy
+import binascii
+import hashlib
 import io
+import itertools
 import logging
+import marshal
+import mmap
+import multiprocessing
+import multiprocessing.pool
 import os
+import random
+import re
+import struct
 import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
 from ast import literal_eval
 
 import yaml
 
+# PyYAML's libyaml based loader and dumper are much faster than the pure Python
+# ones, but PyYAML is not always built with libyaml
+try:
+    from yaml import CSafeDumper as _CSafeDumperBase
+    from yaml import CSafeLoader as _CSafeLoaderBase
+except ImportError:
+    _CSafeDumperBase = _CSafeLoaderBase = None
+
 # Flag for py2 and py3 compatibility to use when separate code paths are necessary
 # When _PY2 is False, we assume Python 3 is in use
 _PY2 = sys.version_info.major == 2
@@ -50,6 +74,48 @@ _VALID_TYPES = {tuple, list, str, int, float, bool, type(None)}
 if _PY2:
     _VALID_TYPES = _VALID_TYPES.union({unicode})  # noqa: F821
 
+# Binary snapshot format (see CfgNode.save_snapshot): a header made of a magic
+# string, the format version, the Python major version and marshal version used
+# to encode the payload, and a CRC32 checksum of the payload
+_SNAPSHOT_MAGIC = b"YACSSNAP"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<8sHBBI")
+
+# Shared config format (see CfgNode.publish_shared): a header made of a magic
+# string, the Python major version and the offset of the root node. A node is its
+# number of keys, followed by one entry per key in insertion order and by the
+# entry numbers sorted by key, which are binary searched by key lookups. An entry
+# is the offset and size of the key, the kind of value, then either the value or
+# the offset and size of its data
+_SHARED_MAGIC = b"YACSSHM1"
+_SHARED_HEADER = struct.Struct("<8sBQ")
+_SHARED_COUNT = struct.Struct("<I")
+_SHARED_ENTRY = struct.Struct("<IIBqI")
+_SHARED_DOUBLE = struct.Struct("<d")
+_SHARED_INT64 = struct.Struct("<q")
+(
+    _SHARED_NONE,
+    _SHARED_BOOL,
+    _SHARED_INT,
+    _SHARED_FLOAT,
+    _SHARED_STR,
+    _SHARED_NODE,
+    _SHARED_MARSHAL,
+) = range(7)
+
+# YAML backends that can be selected with set_yaml_backend
+_YAML_BACKENDS = {"auto", "libyaml", "python"}
+
+# Config files smaller than this in total are loaded by merge_from_files one after
+# the other: starting a pool of processes takes about 10 ms, in which about 20 KB
+# of YAML are parsed
+_MIN_POOL_BYTES = 64 * 1024
+
+# Leaf types that are immutable and can therefore be shared instead of copied
+_IMMUTABLE_TYPES = {str, int, float, bool, type(None)}
+if _PY2:
+    _IMMUTABLE_TYPES = _IMMUTABLE_TYPES.union({unicode})  # noqa: F821
+
 # Utilities for importing modules from file paths
 if _PY2:
     # imp is available in both py2 and py3 for now, but is deprecated in py3
@@ -70,6 +136,10 @@ class CfgNode(dict):
     DEPRECATED_KEYS = "__deprecated_keys__"
     RENAMED_KEYS = "__renamed_keys__"
     NEW_ALLOWED = "__new_allowed__"
+    SHARED = "__shared__"
+    KEY_INDEX = "__key_index__"
+    LAZY = "__lazy__"
+    FINGERPRINT = "__fingerprint__"
 
     def __init__(self, init_dict=None, key_list=None, new_allowed=False):
         """
@@ -83,31 +153,44 @@ class CfgNode(dict):
         # Recursively convert nested dictionaries in init_dict into CfgNodes
         init_dict = {} if init_dict is None else init_dict
         key_list = [] if key_list is None else key_list
+        lazy = type(init_dict) is _LazyDict
         init_dict = self._create_config_tree_from_dict(init_dict, key_list)
         super(CfgNode, self).__init__(init_dict)
-        # Manage if the CfgNode is frozen or not
-        self.__dict__[CfgNode.IMMUTABLE] = False
+        if lazy:
+            # Some children may still be dicts to convert on first access
+            self.__dict__[CfgNode.LAZY] = True
+        # Manage if the CfgNode is frozen or not. The states of the nested CfgNodes
+        # are linked to this state, so that a whole tree can be frozen in O(1)
+        self.__dict__[CfgNode.IMMUTABLE] = _FrozenState(self)
+        for v in init_dict.values():
+            if isinstance(v, CfgNode):
+                _attach_frozen_state(v, self, since=0)
         # Deprecated options
         # If an option is removed from the code and you don't want to break existing
-        # yaml configs, you can add the full config key as a string to the set below.
-        self.__dict__[CfgNode.DEPRECATED_KEYS] = set()
+        # yaml configs, you can add the full config key as a string to this set (see
+        # `register_deprecated_key`). Keys are usually only registered on the root,
+        # so all other CfgNodes share an empty default.
+        self.__dict__[CfgNode.DEPRECATED_KEYS] = _NO_DEPRECATED_KEYS
         # Renamed options
         # If you rename a config option, record the mapping from the old name to the new
-        # name in the dictionary below. Optionally, if the type also changed, you can
-        # make the value a tuple that specifies first the renamed key and then
-        # instructions for how to edit the config file.
-        self.__dict__[CfgNode.RENAMED_KEYS] = {
-            # 'EXAMPLE.OLD.KEY': 'EXAMPLE.NEW.KEY',  # Dummy example to follow
-            # 'EXAMPLE.OLD.KEY': (                   # A more complex example to follow
-            #     'EXAMPLE.NEW.KEY',
-            #     "Also convert to a tuple, e.g., 'foo' -> ('foo',) or "
-            #     + "'foo:bar' -> ('foo', 'bar')"
-            # ),
-        }
+        # name in this dictionary (see `register_renamed_key`). Optionally, if the type
+        # also changed, you can make the value a tuple that specifies first the renamed
+        # key and then instructions for how to edit the config file, e.g.:
+        #     'EXAMPLE.OLD.KEY': 'EXAMPLE.NEW.KEY',  # Dummy example to follow
+        #     'EXAMPLE.OLD.KEY': (                   # A more complex example to follow
+        #         'EXAMPLE.NEW.KEY',
+        #         "Also convert to a tuple, e.g., 'foo' -> ('foo',) or "
+        #         + "'foo:bar' -> ('foo', 'bar')"
+        #     ),
+        self.__dict__[CfgNode.RENAMED_KEYS] = _NO_RENAMED_KEYS
 
         # Allow new attributes after initialisation
         self.__dict__[CfgNode.NEW_ALLOWED] = new_allowed
 
+        # Keys of the child CfgNodes borrowed from another config (see
+        # `clone(copy_on_write=True)`), which are copied before being handed out
+        self.__dict__[CfgNode.SHARED] = _NO_SHARED_KEYS
+
     @classmethod
     def _create_config_tree_from_dict(cls, dic, key_list):
         """
@@ -119,12 +202,19 @@ class CfgNode(dict):
             key_list (list[str]): a list of names which index this CfgNode from the root.
                 Currently only used for logging purposes.
         """
-        dic = copy.deepcopy(dic)
+        # Only the top level is copied here; nested dicts are copied when their
+        # CfgNode is created and leaves are copied (at most once) below
+        lazy = type(dic) is _LazyDict
+        dic = dict(dic)
         for k, v in dic.items():
             if isinstance(v, dict):
-                # Convert dict to CfgNode
-                dic[k] = cls(v, key_list=key_list + [k])
-            else:
+                # Convert dict to CfgNode; in a lazily loaded config, this is done
+                # on first access (see `_materialize_child`)
+                if lazy:
+                    dic[k] = _LazyDict(v, key_list + [k])
+                else:
+                    dic[k] = cls(v, key_list=key_list + [k])
+            elif type(v) not in _IMMUTABLE_TYPES:
                 # Check for valid leaf type or nested CfgNode
                 _assert_with_logging(
                     _valid_type(v, allow_cfg_node=False),
@@ -132,13 +222,185 @@ class CfgNode(dict):
                         ".".join(key_list + [str(k)]), type(v), _VALID_TYPES
                     ),
                 )
+                dic[k] = _copy_leaf(v)
         return dic
 
     def __getattr__(self, name):
-        if name in self:
-            return self[name]
-        else:
+        value = dict.get(self, name, _MISSING)
+        if value is _MISSING:
             raise AttributeError(name)
+        if not isinstance(value, dict):
+            # Leaves are handed out as by __getitem__; skip the second lookup
+            value_type = type(value)
+            if value_type is list or (
+                value_type is tuple
+                and not _IMMUTABLE_TYPES.issuperset(map(type, value))
+                and _is_mutable_leaf(value)
+            ):
+                self._hand_out_mutable_leaves()
+            return value
+        return self[name]
+
+    def __getitem__(self, key):
+        value = super(CfgNode, self).__getitem__(key)
+        if type(value) is _LazyDict:
+            value = self._materialize_child(key, value)
+        if isinstance(value, CfgNode):
+            if key in self.__dict__.get(CfgNode.SHARED, ()):
+                # A borrowed CfgNode belongs to another config; hand out a private
+                # copy
+                value = self._unshare_child(key, value)
+        elif type(value) not in _IMMUTABLE_TYPES and _is_mutable_leaf(value):
+            self._hand_out_mutable_leaves()
+        return value
+
+    def __setitem__(self, key, value):
+        old_value = super(CfgNode, self).get(key, _MISSING)
+        if (
+            old_value is _MISSING
+            or isinstance(old_value, (CfgNode, _LazyDict))
+            or isinstance(value, CfgNode)
+        ):
+            _structure_changed(self)
+        else:
+            _content_changed(self)
+        # The frozen state is not restored yet when unpickling
+        state = self.__dict__.get(CfgNode.IMMUTABLE)
+        if state is not None and value is not old_value:
+            if isinstance(old_value, CfgNode):
+                _detach_frozen_state(old_value, self)
+            if isinstance(value, CfgNode):
+                _attach_frozen_state(value, self)
+        super(CfgNode, self).__setitem__(key, value)
+        self._removed_shared_key(key)
+
+    def __delitem__(self, key):
+        _structure_changed(self)
+        self._removed(super(CfgNode, self).pop(key))
+        self._removed_shared_key(key)
+
+    def pop(self, *args):
+        if args and args[0] in self.__dict__.get(CfgNode.SHARED, ()):
+            # Hand out a private copy
+            self[args[0]]
+        if self.__dict__.get(CfgNode.LAZY, False):
+            self._materialize_children()
+        _structure_changed(self)
+        value = super(CfgNode, self).pop(*args)
+        self._removed(value)
+        return value
+
+    def popitem(self):
+        self._unshare_children()
+        _structure_changed(self)
+        item = super(CfgNode, self).popitem()
+        self._removed(item[1])
+        return item
+
+    def clear(self):
+        _structure_changed(self)
+        values = list(super(CfgNode, self).values())
+        super(CfgNode, self).clear()
+        for value in values:
+            self._removed(value)
+        self.__dict__[CfgNode.SHARED] = _NO_SHARED_KEYS
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for arg in args:
+            # dict() copies the values of a dict without calling items()
+            if isinstance(arg, CfgNode):
+                arg._unshare_children()
+        # Set the values one by one so that sub-configs are attached to this tree
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
+
+    def get(self, key, default=None):
+        value = super(CfgNode, self).get(key, default)
+        if type(value) is _LazyDict:
+            value = self._materialize_child(key, value)
+        elif isinstance(value, CfgNode):
+            if key in self.__dict__.get(CfgNode.SHARED, ()):
+                value = self._unshare_child(key, value)
+        elif type(value) not in _IMMUTABLE_TYPES and _is_mutable_leaf(value):
+            self._hand_out_mutable_leaves()
+        return value
+
+    def items(self):
+        self._unshare_children()
+        return super(CfgNode, self).items()
+
+    def values(self):
+        self._unshare_children()
+        return super(CfgNode, self).values()
+
+    def copy(self):
+        self._unshare_children()
+        return super(CfgNode, self).copy()
+
+    if _PY2:
+
+        def iteritems(self):
+            self._unshare_children()
+            return super(CfgNode, self).iteritems()
+
+        def itervalues(self):
+            self._unshare_children()
+            return super(CfgNode, self).itervalues()
+
+        def viewitems(self):
+            if self.__dict__.get(CfgNode.LAZY, False):
+                self._materialize_children()
+            return super(CfgNode, self).viewitems()
+
+        def viewvalues(self):
+            if self.__dict__.get(CfgNode.LAZY, False):
+                self._materialize_children()
+            return super(CfgNode, self).viewvalues()
+
+    def _materialize_child(self, key, lazy_dict):
+        """Convert the dict `lazy_dict` of a lazily loaded config at `key` to a
+        CfgNode, as it would have been when loading the config eagerly.
+        """
+        child = type(self)(lazy_dict, key_list=lazy_dict.key_list)
+        # The child has always been part of this tree
+        _attach_frozen_state(child, self, since=0)
+        super(CfgNode, self).__setitem__(key, child)
+        return child
+
+    def _materialize_children(self):
+        for k, v in list(super(CfgNode, self).items()):
+            if type(v) is _LazyDict:
+                self._materialize_child(k, v)
+        del self.__dict__[CfgNode.LAZY]
+
+    def __deepcopy__(self, memo):
+        cls = self.__class__
+        node = cls.__new__(cls)
+        memo[id(self)] = node
+        shared_keys = self.__dict__.get(CfgNode.SHARED, _NO_SHARED_KEYS)
+        for k, v in super(CfgNode, self).items():
+            # The dicts of a lazily loaded config are never modified, so they can
+            # be shared by the copy, and borrowed CfgNodes are borrowed by the copy
+            if type(v) is not _LazyDict and k not in shared_keys:
+                v = copy.deepcopy(v, memo)
+            super(CfgNode, node).__setitem__(k, v)
+        node.__dict__.update(_copy_internal_state(self, memo))
+        # The states of the CfgNodes containing this one that are not copied along
+        # with it are left without owner (see _FrozenState)
+        node.__dict__[CfgNode.IMMUTABLE].bind(node)
+        node._borrow_shared_children()
+        return node
+
+    def __setstate__(self, state):
+        # Unpickling: restore the internal state
+        self.__dict__.update(state)
+        self.__dict__[CfgNode.IMMUTABLE].bind(self)
+        self._borrow_shared_children()
 
     def __setattr__(self, name, value):
         if self.is_frozen():
@@ -174,7 +436,7 @@ class CfgNode(dict):
 
         r = ""
         s = []
-        for k, v in sorted(self.items()):
+        for k, v in sorted(_items(self)):
             seperator = "\n" if isinstance(v, CfgNode) else " "
             attr_str = "{}:{}{}".format(str(k), seperator, str(v))
             attr_str = _indent(attr_str, 2)
@@ -183,6 +445,8 @@ class CfgNode(dict):
         return r
 
     def __repr__(self):
+        if self.__dict__.get(CfgNode.LAZY, False):
+            self._materialize_children()
         return "{}({})".format(self.__class__.__name__, super(CfgNode, self).__repr__())
 
     def dump(self, **kwargs):
@@ -198,13 +462,66 @@ class CfgNode(dict):
                 )
                 return cfg_node
             else:
-                cfg_dict = dict(cfg_node)
+                cfg_dict = dict(_items(cfg_node))
                 for k, v in cfg_dict.items():
                     cfg_dict[k] = convert_to_dict(v, key_list + [k])
                 return cfg_dict
 
         self_as_dict = convert_to_dict(self, [])
-        return yaml.safe_dump(self_as_dict, **kwargs)
+        dumper = _get_yaml_dumper(self_as_dict, kwargs)
+        return _emit_yaml(self_as_dict, dumper, kwargs)
+
+    def dump_to(self, stream, **kwargs):
+        """
+        Dump to the file object `stream`. This writes the same output as `dump`
+        with the same options, but as it is generated from the config, without
+        intermediate copies of the config or of the output.
+        """
+        _check_dump_types(self, [])
+        dumper_cls = _get_yaml_dumper(self, kwargs)
+        if (
+            dumper_cls.yaml_path_resolvers
+            or dumper_cls.yaml_representers.get(dict)
+            is not yaml.SafeDumper.yaml_representers[dict]
+        ):
+            # Path resolvers and custom dict representers need the whole document
+            stream.write(self.dump(**kwargs))
+            return
+        _YamlStreamEmitter(dumper_cls(stream, **kwargs)).emit_document(self, kwargs)
+
+    def save_snapshot(self, filename):
+        """
+        Save this CfgNode to a binary snapshot file. Unlike `dump`, a snapshot also
+        keeps the new_allowed flags and the deprecated/renamed key registries, and
+        it is loaded (see `load_snapshot`) much faster than YAML. Snapshots can only
+        be loaded by the same major version of Python.
+        """
+        with open(filename, "wb") as f:
+            f.write(_snapshot_to_bytes(self))
+
+    def publish_shared(self, name):
+        """
+        Publish this frozen CfgNode in shared memory under `name`, and return the
+        path of the published file. Other processes attach to it by name with
+        `attach_shared`, without parsing it or holding a copy of the config. `name`
+        is created in /dev/shm when available (or else in the temporary directory)
+        unless it is a path; remove it with `unlink_shared` when it is not needed.
+        """
+        _assert_with_logging(
+            self.is_frozen(), "Only a frozen CfgNode can be published in shared memory"
+        )
+        path = _shared_cfg_path(name)
+        fd, tmp_filename = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", prefix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_SharedCfgWriter().to_bytes(self))
+            os.rename(tmp_filename, path)
+        except BaseException:
+            os.remove(tmp_filename)
+            raise
+        return path
 
     def merge_from_file(self, cfg_filename):
         """Load a yaml config file and merge it this CfgNode."""
@@ -212,6 +529,38 @@ class CfgNode(dict):
             cfg = self.load_cfg(f)
         self.merge_from_other_cfg(cfg)
 
+    def merge_from_files(self, cfg_filenames, workers=None, use_processes=True):
+        """
+        Load config files and merge them into this CfgNode in the given order, which
+        gives the same result as calling `merge_from_file` on each of them. The
+        files are loaded concurrently by `workers` processes, one per CPU by
+        default, or by threads if `use_processes` is False (loading YAML holds the
+        GIL, so threads only help when reading the files is slow). With a single
+        worker (e.g., on a single CPU) or small files, the files are loaded one
+        after the other, as starting the workers would take longer. Errors name the
+        file they come from.
+        """
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        workers = max(1, min(workers, len(cfg_filenames)))
+        args = [(type(self), filename) for filename in cfg_filenames]
+        if workers == 1 or _total_file_size(cfg_filenames) < _MIN_POOL_BYTES:
+            cfgs = [_load_cfg_file(a) for a in args]
+        else:
+            if use_processes:
+                pool = multiprocessing.Pool(workers)
+            else:
+                pool = multiprocessing.pool.ThreadPool(workers)
+            try:
+                cfgs = pool.map(_load_cfg_file, args)
+            finally:
+                pool.terminate()
+        for filename, cfg in zip(cfg_filenames, cfgs):
+            try:
+                self.merge_from_other_cfg(cfg)
+            except (AssertionError, KeyError, ValueError) as e:
+                raise _exception_with_filename(e, filename)
+
     def merge_from_other_cfg(self, cfg_other):
         """Merge `cfg_other` into this CfgNode."""
         _merge_a_into_b(cfg_other, self, self, [])
@@ -232,19 +581,148 @@ class CfgNode(dict):
                 continue
             if root.key_is_renamed(full_key):
                 root.raise_key_rename_error(full_key)
-            key_list = full_key.split(".")
-            d = self
-            for subkey in key_list[:-1]:
-                _assert_with_logging(
-                    subkey in d, "Non-existent key: {}".format(full_key)
-                )
-                d = d[subkey]
-            subkey = key_list[-1]
-            _assert_with_logging(subkey in d, "Non-existent key: {}".format(full_key))
+            d, subkey = self._find_key(full_key, for_update=True)
             value = self._decode_cfg_value(v)
             value = _check_and_coerce_cfg_value_type(value, d[subkey], subkey, full_key)
             d[subkey] = value
 
+    def compile_overrides(self, full_keys):
+        """
+        Compile overrides of the keys `full_keys` (e.g. `['FOO.BAR', 'FOO.BAZ']`)
+        of this CfgNode into a reusable plan. `plan.apply(cfg, values)` is then
+        equivalent to `cfg.merge_from_list` with `full_keys` and `values`
+        interleaved, but the keys are only split and checked once, here. A plan
+        can be applied to any config with the keys of this one, e.g. its clones.
+        """
+        return _OverridePlan(self, full_keys)
+
+    def sweep(self, space, num_samples=None, seed=None, unique=True):
+        """
+        Lazily generate configs from this CfgNode and a search space.
+
+        `space` maps full keys (e.g. `FOO.BAR`) to a list of values or to a
+        distribution, i.e. a function that takes a `random.Random` and returns a
+        value. Without `num_samples`, the full grid of values (which requires lists
+        of values only) is generated; otherwise `num_samples` configs are sampled
+        from `space`, using `seed` to seed the random number generator.
+
+        Yields (digest, cfg) pairs. `cfg` is a frozen copy-on-write clone of this
+        CfgNode (see `clone`) that shares the sub-configs no key of `space` is in.
+        `digest` is a hash of the content of `cfg` that is stable across processes;
+        configs whose digest was already generated are skipped if `unique`.
+        """
+        sweep = _Sweep(self, space, num_samples, seed, unique)
+        return ((digest, cfg) for digest, cfg, _ in sweep)
+
+    def save_sweep(self, filename, space, num_samples=None, seed=None, unique=True):
+        """
+        Save the configs generated by `sweep` (with the same arguments) to a single
+        YAML file in one pass. The file holds this CfgNode and the values of the
+        keys of `space` of each config; see `load_sweep`. As with `dump`, tuples
+        are saved as lists. Return the number of configs saved.
+        """
+        sweep = _Sweep(self, space, num_samples, seed, unique)
+        # The output does not need to match what the pure Python emitter produces
+        dumper = _get_yaml_dumper(None, {})
+        num_configs = 0
+        with open(filename, "w") as f:
+            f.write("BASE:\n" + _indent_yaml(self.dump()))
+            f.write("KEYS:\n" + _indent_yaml(yaml.dump(sweep.keys, Dumper=dumper)))
+            f.write("POINTS:\n")
+            for digest, _, values in sweep:
+                f.write(_indent_yaml(yaml.dump({digest: values}, Dumper=dumper)))
+                num_configs += 1
+        return num_configs
+
+    def get_by_path(self, full_key):
+        """Return the value of the key `full_key` (e.g. `FOO.BAR`) of this CfgNode.
+        """
+        d, subkey = self._find_key(full_key)
+        value = _get_child_for_read(d, subkey)
+        if isinstance(value, CfgNode) or not _is_immutable_leaf(value):
+            # Hand out a private copy of a borrowed value that can be modified
+            d, subkey = self._find_key(full_key, for_update=True)
+            value = d[subkey]
+        return value
+
+    def set_by_path(self, full_key, value):
+        """Set the existing key `full_key` (e.g. `FOO.BAR`) of this CfgNode to
+        `value`. This is equivalent to setting the attribute (e.g.
+        `cfg.FOO.BAR = value`).
+        """
+        d, subkey = self._find_key(full_key, for_update=True)
+        setattr(d, subkey, value)
+
+    def fingerprint(self, keys=None):
+        """
+        Return a hash of the content of this CfgNode (a hex string) that is stable
+        across processes, e.g. to use as a cache key. It does not depend on the
+        order of the keys, and lists and tuples hash differently. If `keys` (a list
+        of full keys, e.g. ["MODEL", "SOLVER.BASE_LR"]) is given, only the values of
+        these keys are hashed.
+
+        The hashes of frozen sub-configs are memoized, so hashing a frozen config
+        again only costs a lookup until it or one of its sub-configs is changed or
+        defrosted, or hands out a list (which can be changed in place). Changes
+        made in place to a list read before the hash was memoized are not
+        detected.
+        """
+        if keys is None:
+            digest = _fingerprint_node(self)
+        else:
+            h = hashlib.sha1(b"K")
+            for full_key in sorted(set(keys)):
+                d, subkey = self._find_key(full_key)
+                h.update(_fingerprint_value(full_key))
+                h.update(_fingerprint_value(_get_child_for_read(d, subkey)))
+            digest = h.digest()
+        return binascii.hexlify(digest).decode("ascii")
+
+    def diff(self, other):
+        """
+        Compare this CfgNode to the CfgNode `other`, and return their differences
+        with the `added`, `removed` and `changed` keys by full key (e.g. `FOO.BAR`).
+        Sub-configs shared by both configs (e.g., by copy-on-write clones) and
+        frozen sub-configs with the same memoized fingerprint (see `fingerprint`)
+        are skipped, so nearly identical configs are compared quickly.
+        """
+        diff = _CfgDiff()
+        _diff_nodes(self, other, "", diff)
+        return diff
+
+    def set_key_index_enabled(self, is_enabled):
+        """
+        Enable (or disable) the key index of this CfgNode. The index maps each full
+        key (e.g. `FOO.BAR`) to the CfgNode holding it, which turns the key lookups
+        of `merge_from_list`, `get_by_path` and `set_by_path` into a single dict
+        lookup. It is built lazily and rebuilt after keys are added or removed.
+        """
+        self.__dict__[CfgNode.KEY_INDEX] = _KeyIndex() if is_enabled else None
+
+    def is_key_index_enabled(self):
+        return self.__dict__.get(CfgNode.KEY_INDEX) is not None
+
+    def _find_key(self, full_key, for_update=False):
+        """Return the (CfgNode, key) pair holding the existing key `full_key`. If
+        `for_update` is True, borrowed CfgNodes on the path are replaced with
+        private copies, so the returned CfgNode can be modified.
+        """
+        index = self.__dict__.get(CfgNode.KEY_INDEX)
+        if index is not None:
+            # Keys of borrowed CfgNodes are not indexed
+            entry = index.get_entries(self).get(full_key)
+            if entry is not None:
+                return entry
+        get_child = _get_child_for_update if for_update else _get_child_for_read
+        key_list = full_key.split(".")
+        d = self
+        for subkey in key_list[:-1]:
+            _assert_with_logging(subkey in d, "Non-existent key: {}".format(full_key))
+            d = get_child(d, subkey)
+        subkey = key_list[-1]
+        _assert_with_logging(subkey in d, "Non-existent key: {}".format(full_key))
+        return d, subkey
+
     def freeze(self):
         """Make this CfgNode and all of its children immutable."""
         self._immutable(True)
@@ -255,48 +733,161 @@ class CfgNode(dict):
 
     def is_frozen(self):
         """Return mutability."""
-        return self.__dict__[CfgNode.IMMUTABLE]
+        return self.__dict__[CfgNode.IMMUTABLE].get()[1]
 
     def _immutable(self, is_immutable):
         """Set immutability to is_immutable and recursively apply the setting
         to all nested CfgNodes.
         """
-        self.__dict__[CfgNode.IMMUTABLE] = is_immutable
-        # Recursively set immutable state
-        for v in self.__dict__.values():
-            if isinstance(v, CfgNode):
-                v._immutable(is_immutable)
-        for v in self.values():
-            if isinstance(v, CfgNode):
-                v._immutable(is_immutable)
+        # Setting the state applies to all nested CfgNodes, which are linked to it
+        state = self.__dict__[CfgNode.IMMUTABLE]
+        state.set(is_immutable)
+        if not is_immutable:
+            # Leaves (e.g., lists) can now be modified in place, which cannot be
+            # detected (nor copied for the configs borrowing them beforehand)
+            state.changed()
+
+    def view(self):
+        """
+        Return an immutable snapshot of this frozen CfgNode for hot loops. Its keys
+        are plain attributes (e.g., `view.MODEL.TYPE`), which are read faster than
+        the keys of a CfgNode. Later changes to the CfgNode are not reflected.
+        """
+        _assert_with_logging(self.is_frozen(), "Only a frozen CfgNode has a view")
+        return _CfgView(self)
 
-    def clone(self):
-        """Recursively copy this CfgNode."""
+    def to_frozen_struct(self):
+        """
+        Return a copy of this frozen CfgNode as nested immutable records (named
+        tuples), for hot code paths where reading a key should cost about as much
+        as reading a plain attribute. The record types are generated from the keys
+        of the config and cached, so configs with the same keys share them. Use
+        `from_frozen_struct` to convert the records back to a CfgNode.
+        """
+        _assert_with_logging(
+            self.is_frozen(), "Only a frozen CfgNode can be converted to records"
+        )
+        return _to_frozen_struct(self, [])[0]
+
+    def clone(self, copy_on_write=False):
+        """Recursively copy this CfgNode.
+
+        If `copy_on_write` is True, the sub-configs of this CfgNode are lent to
+        the clone instead of being copied. The clone only copies a borrowed
+        sub-config (one level at a time) when it is accessed through the clone, and
+        this CfgNode stays unchanged: its sub-configs are copied for the clones
+        borrowing them before they are changed. So only the accessed paths are ever
+        copied, which is much cheaper than a full copy when cloning a frozen config
+        many times. Mutable leaves (e.g., lists) handed out by this CfgNode after
+        cloning it are its own too, but changes made in place to the ones read
+        before cloning it cannot be detected and reach the clone.
+        """
+        if copy_on_write:
+            return self._copy_sharing_children()
         return copy.deepcopy(self)
 
+    def _removed(self, value):
+        """Detach `value`, which was removed from this CfgNode, from its tree."""
+        if isinstance(value, CfgNode):
+            _detach_frozen_state(value, self)
+
+    def _copy_sharing_children(self):
+        """Copy this CfgNode, lending (instead of copying) its child CfgNodes to
+        the copy.
+        """
+        cls = self.__class__
+        node = cls.__new__(cls)
+        shared_keys = set()
+        for k, v in _items(self):
+            if isinstance(v, CfgNode):
+                shared_keys.add(k)
+            else:
+                v = _copy_leaf(v)
+            super(CfgNode, node).__setitem__(k, v)
+        # The frozen state is not copied (a None memo entry stands for the copy)
+        state = self.__dict__[CfgNode.IMMUTABLE]
+        node.__dict__.update(_copy_internal_state(self, {id(state): None}))
+        node.__dict__[CfgNode.SHARED] = shared_keys or _NO_SHARED_KEYS
+        node.__dict__[CfgNode.IMMUTABLE] = _FrozenState(node)
+        if self.is_frozen():
+            node.__dict__[CfgNode.IMMUTABLE].set(True)
+        node._borrow_shared_children()
+        return node
+
+    def _borrow_shared_children(self):
+        """Register this CfgNode as a borrower of its borrowed child CfgNodes."""
+        for k in self.__dict__.get(CfgNode.SHARED, _NO_SHARED_KEYS):
+            child = super(CfgNode, self).__getitem__(k)
+            child.__dict__[CfgNode.IMMUTABLE].lend(self)
+
+    def _unshare_child(self, key, child):
+        """Replace the borrowed child CfgNode `child` at `key` with a private copy
+        that takes this CfgNode's mutability.
+        """
+        child = child._copy_sharing_children()
+        child.__dict__[CfgNode.IMMUTABLE] = _FrozenState(child)
+        _attach_frozen_state(child, self, since=0)
+        self.__dict__[CfgNode.SHARED].discard(key)
+        # The content is unchanged, so the configs borrowing this CfgNode can keep
+        # it (but key indices are out of date)
+        self.__dict__[CfgNode.IMMUTABLE].changed(structure=True)
+        super(CfgNode, self).__setitem__(key, child)
+        return child
+
+    def _unshare_children(self):
+        """Replace the lazily loaded and borrowed children of this CfgNode with
+        CfgNodes of its own, before they are handed out.
+        """
+        if self.__dict__.get(CfgNode.LAZY, False):
+            self._materialize_children()
+        shared_keys = self.__dict__.get(CfgNode.SHARED)
+        if shared_keys:
+            for k in list(shared_keys):
+                self._unshare_child(k, super(CfgNode, self).__getitem__(k))
+        if any(_is_mutable_leaf(v) for v in super(CfgNode, self).values()):
+            self._hand_out_mutable_leaves()
+
+    def _hand_out_mutable_leaves(self):
+        """Record that the mutable leaves (e.g., lists) of this CfgNode are about to
+        be handed out, as they can then be modified in place, even when frozen.
+        """
+        _content_changed(self)
+
+    def _removed_shared_key(self, key):
+        """Forget that `key`, which was set or removed, held a borrowed CfgNode."""
+        shared_keys = self.__dict__.get(CfgNode.SHARED)
+        if shared_keys and key in shared_keys:
+            shared_keys.discard(key)
+
     def register_deprecated_key(self, key):
         """Register key (e.g. `FOO.BAR`) a deprecated option. When merging deprecated
         keys a warning is generated and the key is ignored.
         """
+        deprecated_keys = self.__dict__[CfgNode.DEPRECATED_KEYS]
         _assert_with_logging(
-            key not in self.__dict__[CfgNode.DEPRECATED_KEYS],
+            key not in deprecated_keys,
             "key {} is already registered as a deprecated key".format(key),
         )
-        self.__dict__[CfgNode.DEPRECATED_KEYS].add(key)
+        if isinstance(deprecated_keys, frozenset):
+            deprecated_keys = self.__dict__[CfgNode.DEPRECATED_KEYS] = set()
+        deprecated_keys.add(key)
 
     def register_renamed_key(self, old_name, new_name, message=None):
         """Register a key as having been renamed from `old_name` to `new_name`.
         When merging a renamed key, an exception is thrown alerting to user to
         the fact that the key has been renamed.
         """
+        renamed_keys = self.__dict__[CfgNode.RENAMED_KEYS]
         _assert_with_logging(
-            old_name not in self.__dict__[CfgNode.RENAMED_KEYS],
+            old_name not in renamed_keys,
             "key {} is already registered as a renamed cfg key".format(old_name),
         )
         value = new_name
         if message:
             value = (new_name, message)
-        self.__dict__[CfgNode.RENAMED_KEYS][old_name] = value
+        if isinstance(renamed_keys, _ReadOnlyDict):
+            renamed_keys = self.__dict__[CfgNode.RENAMED_KEYS] = {}
+        renamed_keys[old_name] = value
 
     def key_is_deprecated(self, full_key):
         """Test if a key is deprecated."""
@@ -330,17 +921,19 @@ class CfgNode(dict):
         Set this config (and recursively its subconfigs) to allow merging
         new keys from other configs.
         """
+        _content_changed(self)
         self.__dict__[CfgNode.NEW_ALLOWED] = is_new_allowed
         # Recursively set new_allowed state
         for v in self.__dict__.values():
             if isinstance(v, CfgNode):
                 v.set_new_allowed(is_new_allowed)
-        for v in self.values():
+        for k in self.keys():
+            v = _get_child_for_update(self, k)
             if isinstance(v, CfgNode):
                 v.set_new_allowed(is_new_allowed)
 
     @classmethod
-    def load_cfg(cls, cfg_file_obj_or_str):
+    def load_cfg(cls, cfg_file_obj_or_str, lazy=False):
         """
         Load a cfg.
         Args:
@@ -350,6 +943,9 @@ class CfgNode(dict):
                 - A file object backed by a Python source file that exports an attribute
                   "cfg" that is either a dict or a CfgNode
                 - A string that can be parsed as valid YAML
+            lazy (bool): if True, the sub-configs of a YAML config are only converted
+                to CfgNodes (and their values checked) when first accessed. This
+                makes loading a large config of which few keys are used faster.
         """
         _assert_with_logging(
             isinstance(cfg_file_obj_or_str, _FILE_TYPES + (str,)),
@@ -358,20 +954,113 @@ class CfgNode(dict):
             ),
         )
         if isinstance(cfg_file_obj_or_str, str):
-            return cls._load_cfg_from_yaml_str(cfg_file_obj_or_str)
+            return cls._load_cfg_from_yaml_str(cfg_file_obj_or_str, lazy)
         elif isinstance(cfg_file_obj_or_str, _FILE_TYPES):
-            return cls._load_cfg_from_file(cfg_file_obj_or_str)
+            return cls._load_cfg_from_file(cfg_file_obj_or_str, lazy)
         else:
             raise NotImplementedError("Impossible to reach here (unless there's a bug)")
 
     @classmethod
-    def _load_cfg_from_file(cls, file_obj):
+    def load_snapshot(cls, filename):
+        """Load a CfgNode from a binary snapshot file saved by `save_snapshot`."""
+        with open(filename, "rb") as f:
+            data = f.read()
+        return cls._load_snapshot_bytes(data, filename)
+
+    @classmethod
+    def attach_shared(cls, name):
+        """
+        Attach to a CfgNode published by `publish_shared`. This returns a frozen,
+        read-only view of the config that reads keys and values from shared memory
+        when they are accessed. It can be pickled cheaply (e.g., to send it to
+        DataLoader workers), as only its name is pickled. Use `clone` to get a
+        regular CfgNode.
+        """
+        return _attach_shared_view(_shared_cfg_path(name), None)
+
+    @classmethod
+    def from_frozen_struct(cls, struct):
+        """Convert records returned by `to_frozen_struct` to a frozen CfgNode."""
+        cfg = cls(_frozen_struct_to_dict(struct))
+        cfg.freeze()
+        return cfg
+
+    @classmethod
+    def load_sweep(cls, filename):
+        """Lazily load the (digest, cfg) pairs of a sweep saved by `save_sweep`."""
+        with open(filename, "r") as f:
+            sweep = yaml.load(f, Loader=_get_yaml_loader())
+        base = cls(sweep["BASE"])
+        plan = base.compile_overrides(sweep["KEYS"])
+        base.freeze()
+        for digest, values in (sweep["POINTS"] or {}).items():
+            cfg = base.clone(copy_on_write=True)
+            plan.apply(cfg, values)
+            cfg.freeze()
+            yield digest, cfg
+
+    @classmethod
+    def _load_snapshot_bytes(cls, data, filename, lazy=False):
+        _assert_with_logging(
+            len(data) >= _SNAPSHOT_HEADER.size
+            and data[: len(_SNAPSHOT_MAGIC)] == _SNAPSHOT_MAGIC,
+            "File {} is not a CfgNode snapshot".format(filename),
+        )
+        _, version, py_major, marshal_version, checksum = _SNAPSHOT_HEADER.unpack_from(
+            data
+        )
+        _assert_with_logging(
+            version == _SNAPSHOT_VERSION,
+            "Unsupported snapshot version {} in {}; expected {}".format(
+                version, filename, _SNAPSHOT_VERSION
+            ),
+        )
+        _assert_with_logging(
+            py_major == sys.version_info.major and marshal_version <= marshal.version,
+            "Snapshot {} was saved by an incompatible Python version".format(filename),
+        )
+        payload = data[_SNAPSHOT_HEADER.size :]
+        _assert_with_logging(
+            zlib.crc32(payload) & 0xFFFFFFFF == checksum,
+            "Snapshot {} is corrupted (checksum mismatch)".format(filename),
+        )
+        tree, meta = marshal.loads(payload)
+        cfg = cls(_LazyDict(tree, []) if lazy else tree)
+        for path, (new_allowed, deprecated_keys, renamed_keys) in meta.items():
+            node = cfg
+            for k in path:
+                node = node[k]
+            node.__dict__[CfgNode.NEW_ALLOWED] = new_allowed
+            node.__dict__[CfgNode.DEPRECATED_KEYS] = set(deprecated_keys)
+            node.__dict__[CfgNode.RENAMED_KEYS] = dict(renamed_keys)
+        return cfg
+
+    @classmethod
+    def _load_cfg_from_file(cls, file_obj, lazy=False):
         """Load a config from a YAML file or a Python source file."""
         _, file_extension = os.path.splitext(file_obj.name)
         if file_extension in _YAML_EXTS:
-            return cls._load_cfg_from_yaml_str(file_obj.read())
+            if _cfg_cache is None:
+                return cls._load_cfg_from_yaml_str(file_obj.read(), lazy)
+            str_obj = file_obj.read()
+            return _cfg_cache.load(
+                cls,
+                file_obj.name,
+                str_obj if isinstance(str_obj, bytes) else str_obj.encode("utf-8"),
+                lambda: cls._load_cfg_from_yaml_str(str_obj, lazy),
+                lazy,
+            )
         elif file_extension in _PY_EXTS:
-            return cls._load_cfg_py_source(file_obj.name)
+            if _cfg_cache is None:
+                return cls._load_cfg_py_source(file_obj.name)
+            with open(file_obj.name, "rb") as f:
+                source = f.read()
+            return _cfg_cache.load(
+                cls,
+                file_obj.name,
+                source,
+                lambda: cls._load_cfg_py_source(file_obj.name),
+            )
         else:
             raise Exception(
                 "Attempt to load from an unsupported file type {}; "
@@ -379,9 +1068,11 @@ class CfgNode(dict):
             )
 
     @classmethod
-    def _load_cfg_from_yaml_str(cls, str_obj):
+    def _load_cfg_from_yaml_str(cls, str_obj, lazy=False):
         """Load a config from a YAML string encoding."""
-        cfg_as_dict = yaml.safe_load(str_obj)
+        cfg_as_dict = _parse_yaml(str_obj)
+        if lazy and isinstance(cfg_as_dict, dict):
+            cfg_as_dict = _LazyDict(cfg_as_dict, [])
         return cls(cfg_as_dict)
 
     @classmethod
@@ -418,10 +1109,19 @@ class CfgNode(dict):
         # All remaining processing is only applied to strings
         if not isinstance(value, str):
             return value
+        # Most strings (names, paths, ...) cannot be literals; skip literal_eval
+        if not _may_be_literal(value):
+            return value
+        # The same strings are decoded on every merge, so decoded values are cached.
+        # Cached values are copied so that callers can modify what they get.
+        decoded = _decode_cache.get(value, _MISSING)
+        if decoded is not _MISSING:
+            return _copy_decoded_value(decoded)
+        decoded = value
         # Try to interpret `value` as a:
         #   string, number, tuple, list, dict, boolean, or None
         try:
-            value = literal_eval(value)
+            decoded = literal_eval(value)
         # The following two excepts allow v to pass through when it represents a
         # string.
         #
@@ -437,107 +1137,2300 @@ class CfgNode(dict):
             pass
         except SyntaxError:
             pass
-        return value
+        _decode_cache.put(value, decoded)
+        return _copy_decoded_value(decoded)
+
+    @classmethod
+    def decode_cache_info(cls):
+        """Return statistics of the cache of decoded string values as a dict."""
+        return _decode_cache.info()
+
+    @classmethod
+    def clear_decode_cache(cls):
+        """Clear the cache of decoded string values and its statistics."""
+        _decode_cache.clear()
 
 
 load_cfg = (
     CfgNode.load_cfg
 )  # keep this function in global scope for backward compatibility
 
-
-def _valid_type(value, allow_cfg_node=False):
-    return (type(value) in _VALID_TYPES) or (
-        allow_cfg_node and isinstance(value, CfgNode)
-    )
+# YAML backend used by load_cfg and dump; see set_yaml_backend
+_yaml_backend = "auto"
 
 
-def _merge_a_into_b(a, b, root, key_list):
-    """Merge config dictionary a into config dictionary b, clobbering the
-    options in b whenever they are also specified in a.
+def set_yaml_backend(backend):
     """
+    Select the YAML backend used to load and dump configs:
+        - "auto" (default): use libyaml if PyYAML was built with it. `dump` only
+          uses it when the output is identical to the pure Python one, which is the
+          case unless the config has strings with characters other than printable
+          ASCII or very long keys, or `default_style`/`canonical` are used.
+        - "libyaml": always use libyaml.
+        - "python": always use the pure Python implementation.
+    """
+    global _yaml_backend
     _assert_with_logging(
-        isinstance(a, CfgNode),
-        "`a` (cur type {}) must be an instance of {}".format(type(a), CfgNode),
+        backend in _YAML_BACKENDS,
+        "Invalid YAML backend {}; valid backends: {}".format(backend, _YAML_BACKENDS),
     )
     _assert_with_logging(
-        isinstance(b, CfgNode),
-        "`b` (cur type {}) must be an instance of {}".format(type(b), CfgNode),
+        backend != "libyaml" or _CSafeLoaderBase is not None,
+        "The libyaml YAML backend is not available",
     )
+    _yaml_backend = backend
 
-    for k, v_ in a.items():
-        full_key = ".".join(key_list + [k])
 
-        v = copy.deepcopy(v_)
-        v = b._decode_cfg_value(v)
+def get_yaml_backend():
+    return _yaml_backend
 
-        if k in b:
-            v = _check_and_coerce_cfg_value_type(v, b[k], k, full_key)
-            # Recursively merge dicts
-            if isinstance(v, CfgNode):
-                try:
-                    _merge_a_into_b(v, b[k], root, key_list + [k])
-                except BaseException:
-                    raise
-            else:
-                b[k] = v
-        elif b.is_new_allowed():
-            b[k] = v
-        else:
-            if root.key_is_deprecated(full_key):
-                continue
-            elif root.key_is_renamed(full_key):
-                root.raise_key_rename_error(full_key)
+
+if _CSafeLoaderBase is not None:
+
+    class _CSafeLoader(_CSafeLoaderBase):
+        """Like yaml.CSafeLoader, but uses the constructors and resolvers registered
+        on yaml.SafeLoader, as yaml.safe_load does.
+        """
+
+        def __init__(self, stream):
+            _CSafeLoaderBase.__init__(self, stream)
+            for attr in (
+                "yaml_constructors",
+                "yaml_multi_constructors",
+                "yaml_implicit_resolvers",
+                "yaml_path_resolvers",
+            ):
+                setattr(self, attr, getattr(yaml.SafeLoader, attr))
+
+    class _CSafeDumper(_CSafeDumperBase):
+        """Like yaml.CSafeDumper, but uses the representers and resolvers registered
+        on yaml.SafeDumper, as yaml.safe_dump does.
+        """
+
+        def __init__(self, *args, **kwargs):
+            _CSafeDumperBase.__init__(self, *args, **kwargs)
+            for attr in (
+                "yaml_representers",
+                "yaml_multi_representers",
+                "yaml_implicit_resolvers",
+                "yaml_path_resolvers",
+            ):
+                setattr(self, attr, getattr(yaml.SafeDumper, attr))
+
+
+def _check_dump_types(cfg_node, key_list):
+    """Check the types of the values of `cfg_node` like `dump` does."""
+    for k, v in _items(cfg_node):
+        if isinstance(v, CfgNode):
+            _check_dump_types(v, key_list + [k])
+        elif not _valid_type(v):
+            _assert_with_logging(
+                False,
+                "Key {} with value {} is not a valid type; valid types: {}".format(
+                    ".".join(key_list + [k]), type(v), _VALID_TYPES
+                ),
+            )
+
+
+class _YamlStreamEmitter(object):
+    """Emit a CfgNode with a YAML dumper as it is traversed. The events emitted are
+    the ones PyYAML's serializer generates when dumping the config as nested dicts,
+    as `dump` does, but only the nodes of the values of one CfgNode at a time are
+    represented instead of the nodes of the whole document.
+    """
+
+    ANCHOR_TEMPLATE = "id%03d"
+
+    def __init__(self, dumper):
+        self.dumper = dumper
+        self.sort_keys = getattr(dumper, "sort_keys", True)
+        # Anchors of the objects that appear more than once, by object id
+        self.anchors = {}
+        self.node_anchors = {}
+        self.serialized_nodes = set()
+
+    def emit_document(self, cfg, kwargs):
+        dumper = self.dumper
+        try:
+            dumper.open()
+            self._find_anchors(cfg, set())
+            dumper.emit(
+                yaml.DocumentStartEvent(
+                    explicit=kwargs.get("explicit_start"),
+                    version=kwargs.get("version"),
+                    tags=kwargs.get("tags"),
+                )
+            )
+            self._emit_cfg_node(cfg)
+            dumper.emit(yaml.DocumentEndEvent(explicit=kwargs.get("explicit_end")))
+            dumper.close()
+        finally:
+            dumper.dispose()
+
+    def _items(self, mapping):
+        # Same order as the representer of the dumper
+        items = list(mapping.items())
+        if self.sort_keys:
+            try:
+                items = sorted(items)
+            except TypeError:
+                pass
+        return items
+
+    def _find_anchors(self, value, seen):
+        """Find the objects that the representer and serializer of the dumper would
+        alias, and number their anchors in the same order.
+        """
+        if isinstance(value, CfgNode):
+            # `dump` converts each CfgNode to a new dict, which is never aliased
+            for k, v in self._items(value):
+                self._find_anchors(k, seen)
+                self._find_anchors(v, seen)
+            return
+        if self.dumper.ignore_aliases(value):
+            return
+        if id(value) in seen:
+            if id(value) not in self.anchors:
+                anchor = self.ANCHOR_TEMPLATE % (len(self.anchors) + 1)
+                self.anchors[id(value)] = anchor
+            return
+        seen.add(id(value))
+        if isinstance(value, dict):
+            for k, v in self._items(value):
+                self._find_anchors(k, seen)
+                self._find_anchors(v, seen)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                self._find_anchors(v, seen)
+
+    def _represent(self, value):
+        dumper = self.dumper
+        node = dumper.represent_data(value)
+        if self.anchors:
+            for value_id, anchor in self.anchors.items():
+                aliased_node = dumper.represented_objects.get(value_id)
+                if aliased_node is not None:
+                    self.node_anchors[aliased_node] = anchor
+        # Only the nodes of aliased objects are needed later on
+        dumper.represented_objects = {
+            k: v for k, v in dumper.represented_objects.items() if k in self.anchors
+        }
+        del dumper.object_keeper[:]
+        return node
+
+    def _emit_cfg_node(self, cfg_node):
+        dumper = self.dumper
+        items = []
+        best_style = True
+        for k, v in self._items(cfg_node):
+            key_node = self._represent(k)
+            value_node = None if isinstance(v, CfgNode) else self._represent(v)
+            for node in (key_node, value_node):
+                if not (isinstance(node, yaml.ScalarNode) and not node.style):
+                    best_style = False
+            items.append((key_node, v, value_node))
+        flow_style = dumper.default_flow_style
+        if flow_style is None:
+            flow_style = best_style
+        tag = "tag:yaml.org,2002:map"
+        implicit = tag == dumper.resolve(yaml.MappingNode, None, True)
+        dumper.emit(yaml.MappingStartEvent(None, tag, implicit, flow_style=flow_style))
+        for key_node, v, value_node in items:
+            self._serialize_node(key_node)
+            if value_node is None:
+                self._emit_cfg_node(v)
             else:
-                raise KeyError("Non-existent config key: {}".format(full_key))
+                self._serialize_node(value_node)
+        dumper.emit(yaml.MappingEndEvent())
+
+    def _serialize_node(self, node):
+        """Emit the events of a represented node, like yaml.serializer.Serializer."""
+        dumper = self.dumper
+        anchor = self.node_anchors.get(node)
+        if anchor is not None:
+            if node in self.serialized_nodes:
+                dumper.emit(yaml.AliasEvent(anchor))
+                return
+            self.serialized_nodes.add(node)
+        if isinstance(node, yaml.ScalarNode):
+            detected_tag = dumper.resolve(yaml.ScalarNode, node.value, (True, False))
+            default_tag = dumper.resolve(yaml.ScalarNode, node.value, (False, True))
+            implicit = (node.tag == detected_tag), (node.tag == default_tag)
+            dumper.emit(
+                yaml.ScalarEvent(
+                    anchor, node.tag, implicit, node.value, style=node.style
+                )
+            )
+        elif isinstance(node, yaml.SequenceNode):
+            implicit = node.tag == dumper.resolve(yaml.SequenceNode, node.value, True)
+            dumper.emit(
+                yaml.SequenceStartEvent(
+                    anchor, node.tag, implicit, flow_style=node.flow_style
+                )
+            )
+            for item in node.value:
+                self._serialize_node(item)
+            dumper.emit(yaml.SequenceEndEvent())
+        elif isinstance(node, yaml.MappingNode):
+            implicit = node.tag == dumper.resolve(yaml.MappingNode, node.value, True)
+            dumper.emit(
+                yaml.MappingStartEvent(
+                    anchor, node.tag, implicit, flow_style=node.flow_style
+                )
+            )
+            for key, value in node.value:
+                self._serialize_node(key)
+                self._serialize_node(value)
+            dumper.emit(yaml.MappingEndEvent())
 
 
-def _check_and_coerce_cfg_value_type(replacement, original, key, full_key):
-    """Checks that `replacement`, which is intended to replace `original` is of
-    the right type. The type is correct if it matches exactly or is one of a few
-    cases in which the type can be easily coerced.
+def _parse_yaml(str_obj):
+    return yaml.load(str_obj, Loader=_get_yaml_loader())
+
+
+def _emit_yaml(data, dumper, kwargs):
+    return yaml.dump(data, Dumper=dumper, **kwargs)
+
+
+def _get_yaml_loader():
+    if _yaml_backend == "python" or _CSafeLoaderBase is None:
+        return yaml.SafeLoader
+    return _CSafeLoader
+
+
+def _get_yaml_dumper(data, dump_kwargs):
+    if _yaml_backend == "python" or _CSafeDumperBase is None:
+        return yaml.SafeDumper
+    if _yaml_backend == "libyaml":
+        return _CSafeDumper
+    # libyaml and the pure Python emitter fold double-quoted scalars differently
+    # and disagree on when keys of about 128 characters need an explicit "? "
+    if dump_kwargs.get("default_style") or dump_kwargs.get("canonical"):
+        return yaml.SafeDumper
+    if not _emitted_identically_by_libyaml(data):
+        return yaml.SafeDumper
+    return _CSafeDumper
+
+
+# Strings made only of printable ASCII characters are never double-quoted
+_NON_PRINTABLE_ASCII = re.compile("[^\x20-\x7e]")
+_STRING_TYPES = (str, unicode) if _PY2 else (str,)  # noqa: F821
+
+
+def _emitted_identically_by_libyaml(value):
+    if isinstance(value, _STRING_TYPES):
+        return not _NON_PRINTABLE_ASCII.search(value)
+    if isinstance(value, dict):
+        for k, v in _items(value):
+            if isinstance(k, _STRING_TYPES) and (
+                not k or len(k) >= 120 or _NON_PRINTABLE_ASCII.search(k)
+            ):
+                return False
+            if not _emitted_identically_by_libyaml(v):
+                return False
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_emitted_identically_by_libyaml(v) for v in value)
+    return True
+
+
+# Sentinel for missing values
+_MISSING = object()
+
+
+def _structure_changed(node):
+    """Record that a key of the CfgNode `node` is about to be added or removed, or
+    that a sub-config is about to be replaced (see _FrozenState).
     """
-    original_type = type(original)
-    replacement_type = type(replacement)
+    # The frozen state is not restored yet when unpickling
+    state = node.__dict__.get(CfgNode.IMMUTABLE)
+    if state is not None and state.changed(structure=True):
+        _copy_for_borrowers(state)
 
-    # The types must match (with some exceptions)
-    if replacement_type == original_type:
-        return replacement
 
-    # If either of them is None, allow type conversion to one of the valid types
-    if (replacement_type == type(None) and original_type in _VALID_TYPES) or (
-        original_type == type(None) and replacement_type in _VALID_TYPES
-    ):
-        return replacement
+def _content_changed(node):
+    """Record that a value of the CfgNode `node` is about to change (see
+    _FrozenState).
+    """
+    state = node.__dict__.get(CfgNode.IMMUTABLE)
+    if state is not None and state.changed():
+        _copy_for_borrowers(state)
 
-    # Cast replacement from from_type to to_type if the replacement and original
-    # types match from_type and to_type
-    def conditional_cast(from_type, to_type):
-        if replacement_type == from_type and original_type == to_type:
-            return True, to_type(replacement)
-        else:
-            return False, None
 
-    # Conditionally casts
-    # list <-> tuple
-    casts = [(tuple, list), (list, tuple)]
-    # For py2: allow converting from str (bytes) to a unicode string
-    try:
-        casts.append((str, unicode))  # noqa: F821
-    except Exception:
-        pass
+def _copy_for_borrowers(state):
+    """Give the configs borrowing the CfgNode of `state`, or a CfgNode containing
+    it, private copies of the borrowed CfgNodes before it changes (see
+    CfgNode.clone).
+    """
+    while True:
+        # Copies borrow the children of the CfgNodes they copy, so copy from the
+        # top down until the CfgNode of `state` is no longer borrowed
+        lent_state = state.lent_state()
+        if lent_state is None:
+            return
+        borrowers, lent_state.borrowers = lent_state.borrowers, ()
+        node = lent_state.owner()
+        for borrower in borrowers:
+            borrower = borrower()
+            for key in _borrowed_keys(borrower, node):
+                borrower._unshare_child(key, node)
+
+
+def _borrowed_keys(borrower, node):
+    """Return the keys at which the CfgNode `borrower` (if any) still borrows
+    `node`.
+    """
+    if borrower is None:
+        return []
+    shared_keys = borrower.__dict__[CfgNode.SHARED]
+    return [k for k in shared_keys if dict.get(borrower, k) is node]
 
-    for (from_type, to_type) in casts:
-        converted, converted_value = conditional_cast(from_type, to_type)
-        if converted:
-            return converted_value
 
-    raise ValueError(
-        "Type mismatch ({} vs. {}) with values ({} vs. {}) for config "
-        "key: {}".format(
-            original_type, replacement_type, original, replacement, full_key
-        )
+def _items(node):
+    """Return the items of the dict or CfgNode `node`, leaving borrowed CfgNodes
+    borrowed, for code that only reads them.
+    """
+    if isinstance(node, CfgNode) and node.__dict__.get(CfgNode.LAZY, False):
+        node._materialize_children()
+    return dict.items(node)
+
+
+class CompactCfgNode(CfgNode):
+    """
+    A CfgNode that keeps its internal state in slots instead of an instance dict,
+    which makes each node several times smaller. It is used exactly like CfgNode
+    (e.g., `CompactCfgNode.load_cfg(f)` or `CompactCfgNode(init_dict)`) and its
+    sub-configs are CompactCfgNodes too. This is meant for processes holding large
+    configs; accessing the internal state is a bit slower than with CfgNode.
+    """
+
+    __slots__ = (
+        CfgNode.IMMUTABLE,
+        CfgNode.DEPRECATED_KEYS,
+        CfgNode.RENAMED_KEYS,
+        CfgNode.NEW_ALLOWED,
+        CfgNode.SHARED,
+        CfgNode.KEY_INDEX,
+        CfgNode.LAZY,
+        CfgNode.FINGERPRINT,
     )
 
+    @property
+    def __dict__(self):
+        # The instance dict inherited from CfgNode is never created
+        return _SlotsDict(self)
+
+    def __getstate__(self):
+        return dict(self.__dict__.items())
+
+
+class _SlotsDict(object):
+    """A dict-like view of the internal state of a CompactCfgNode, which CfgNode
+    methods access as `node.__dict__`.
+    """
+
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def __getitem__(self, key):
+        try:
+            return _COMPACT_SLOTS[key].__get__(self.node, CompactCfgNode)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        _COMPACT_SLOTS[key].__set__(self.node, value)
+
+    def __delitem__(self, key):
+        try:
+            _COMPACT_SLOTS[key].__delete__(self.node)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        slot = _COMPACT_SLOTS.get(key)
+        if slot is None:
+            return default
+        try:
+            return slot.__get__(self.node, CompactCfgNode)
+        except AttributeError:
+            return default
+
+    def keys(self):
+        return [k for k, _ in self.items()]
+
+    def values(self):
+        return [v for _, v in self.items()]
+
+    def items(self):
+        items = []
+        for key, slot in _COMPACT_SLOTS.items():
+            try:
+                items.append((key, slot.__get__(self.node, CompactCfgNode)))
+            except AttributeError:
+                pass
+        return items
+
+    def update(self, other):
+        for key, value in other.items():
+            self[key] = value
+
+
+# Slot descriptors of CompactCfgNode by internal state key
+_COMPACT_SLOTS = {k: vars(CompactCfgNode)[k] for k in CompactCfgNode.__slots__}
+
+
+class _ReadOnlyDict(dict):
+    """A dict that cannot be modified, like a frozenset for sets."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("{} is read-only".format(type(self).__name__))
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+# Shared, empty defaults of the deprecated and renamed key registries of a CfgNode;
+# a CfgNode gets its own registry when a key is first registered on it
+_NO_DEPRECATED_KEYS = frozenset()
+_NO_RENAMED_KEYS = _ReadOnlyDict()
+# Shared, empty default of the borrowed keys of a CfgNode (see CfgNode.clone)
+_NO_SHARED_KEYS = frozenset()
+
+
+def _copy_internal_state(node, memo):
+    """Deep copy the internal state of a CfgNode, sharing the empty defaults."""
+    memo[id(_NO_DEPRECATED_KEYS)] = _NO_DEPRECATED_KEYS
+    memo[id(_NO_RENAMED_KEYS)] = _NO_RENAMED_KEYS
+    memo[id(_NO_SHARED_KEYS)] = _NO_SHARED_KEYS
+    return copy.deepcopy(dict(node.__dict__.items()), memo)
+
+
+class _CfgView(object):
+    """An immutable snapshot of a CfgNode (see CfgNode.view). Keys are stored as
+    instance attributes, so reading them never calls __getattr__.
+    """
+
+    def __init__(self, cfg):
+        attrs = self.__dict__
+        for k, v in _items(cfg):
+            attrs[k] = _CfgView(v) if isinstance(v, CfgNode) else v
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            "Attempted to set {} to {}, but CfgNode views are immutable".format(
+                name, value
+            )
+        )
+
+    def __delattr__(self, name):
+        raise AttributeError(
+            "Attempted to delete {}, but CfgNode views are immutable".format(name)
+        )
+
+    def __getitem__(self, key):
+        return self.__dict__[key]
+
+    def __contains__(self, key):
+        return key in self.__dict__
+
+    def __iter__(self):
+        return iter(self.__dict__)
+
+    def __len__(self):
+        return len(self.__dict__)
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.__dict__)
+
+
+# Record types generated by CfgNode.to_frozen_struct, by the shape of the config
+# they hold: a tuple of (key, shape of the child CfgNode or None for a leaf)
+_frozen_struct_types = {}
+
+
+def _to_frozen_struct(node, key_list):
+    """Return the records for `node` (see CfgNode.to_frozen_struct) and its shape."""
+    keys, values, shape = [], [], []
+    for k, v in _items(node):
+        if isinstance(v, CfgNode):
+            v, child_shape = _to_frozen_struct(v, key_list + [k])
+        else:
+            v, child_shape = _copy_leaf(v), None
+        keys.append(k)
+        values.append(v)
+        shape.append((k, child_shape))
+    shape = tuple(shape)
+    struct_type = _frozen_struct_types.get(shape)
+    if struct_type is None:
+        try:
+            struct_type = collections.namedtuple("CfgStruct", keys)
+        except (TypeError, ValueError) as e:
+            _assert_with_logging(
+                False,
+                "Cannot convert {} to records: {}".format(
+                    ".".join(key_list) or "the root CfgNode", e
+                ),
+            )
+        _frozen_struct_types[shape] = struct_type
+    return struct_type(*values), shape
+
+
+def _frozen_struct_to_dict(struct):
+    struct_types = set(_frozen_struct_types.values())
+
+    def to_dict(struct):
+        return collections.OrderedDict(
+            (k, to_dict(v) if type(v) in struct_types else v)
+            for k, v in zip(struct._fields, struct)
+        )
+
+    return to_dict(struct)
+
+
+class _LazyDict(dict):
+    """A dict of a lazily loaded config (see CfgNode.load_cfg) that is converted
+    to a CfgNode the first time it is accessed.
+    """
+
+    __slots__ = ("key_list",)
+
+    def __init__(self, dic, key_list):
+        super(_LazyDict, self).__init__(dic)
+        self.key_list = key_list
+
+
+class _KeyIndex(object):
+    """Lazily built map from each full key (e.g. `FOO.BAR`) of a config tree to
+    the (CfgNode, key) pair holding it. Copies of the index start out empty.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.entries = None
+
+    def get_entries(self, root):
+        version = root.__dict__[CfgNode.IMMUTABLE].structure_version
+        if self.version != version:
+            self.entries = {}
+            _index_keys(root, "", self.entries)
+            self.version = version
+        return self.entries
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def __deepcopy__(self, memo):
+        return _KeyIndex()
+
+
+class _FingerprintMemo(object):
+    """The memoized fingerprint of a frozen CfgNode (see CfgNode.fingerprint),
+    valid as long as the CfgNode stays frozen by the same call and neither it nor
+    a nested CfgNode is changed (see _FrozenState.version).
+    """
+
+    __slots__ = ("version", "stamp", "digest")
+
+    def __init__(self, version, stamp, digest):
+        self.version = version
+        self.stamp = stamp
+        self.digest = digest
+
+    def __reduce__(self):
+        # Versions are only meaningful in the process that set them
+        return _FingerprintMemo, (-1, -1, self.digest)
+
+    def __deepcopy__(self, memo):
+        # Copies have states of their own, with other versions
+        return None
+
+
+def _fingerprint_node(node):
+    """Return the SHA-1 digest of the content of the CfgNode `node`."""
+    digest = _memoized_fingerprint(node)
+    if digest is not None:
+        return digest
+    state = node.__dict__[CfgNode.IMMUTABLE]
+    version = state.version
+    h = hashlib.sha1(b"D")
+    for key, value in sorted(
+        (_fingerprint_value(k), _fingerprint_value(v)) for k, v in _items(node)
+    ):
+        h.update(key)
+        h.update(value)
+    digest = h.digest()
+    # Leaves of a mutable CfgNode may be changed in place (e.g., lists), which
+    # cannot be detected
+    stamp, is_frozen = state.get()
+    if is_frozen:
+        node.__dict__[CfgNode.FINGERPRINT] = _FingerprintMemo(version, stamp, digest)
+    return digest
+
+
+def _memoized_fingerprint(node):
+    memo = node.__dict__.get(CfgNode.FINGERPRINT)
+    if memo is None:
+        return None
+    state = node.__dict__[CfgNode.IMMUTABLE]
+    if memo.version != state.version:
+        return None
+    stamp, is_frozen = state.get()
+    if stamp != memo.stamp or not is_frozen:
+        return None
+    return memo.digest
+
+
+def _fingerprint_value(value):
+    """Encode `value` to bytes for hashing. Each encoding starts with a tag for the
+    type and is self-delimiting, so that concatenated encodings are unambiguous.
+    """
+    if isinstance(value, CfgNode):
+        return b"D" + _fingerprint_node(value)
+    value_type = type(value)
+    if value is None:
+        return b"N"
+    if value_type is bool:
+        return b"B1" if value else b"B0"
+    if value_type in (list, tuple):
+        parts = [b"L" if value_type is list else b"T"]
+        parts.append(str(len(value)).encode("ascii") + b":")
+        parts.extend(_fingerprint_value(v) for v in value)
+        return b"".join(parts)
+    if isinstance(value, dict):
+        parts = [b"M", str(len(value)).encode("ascii") + b":"]
+        for item in sorted(
+            _fingerprint_value(k) + _fingerprint_value(v) for k, v in _items(value)
+        ):
+            parts.append(item)
+        return b"".join(parts)
+    if isinstance(value, _STRING_TYPES):
+        tag = b"S"
+        data = value if isinstance(value, bytes) else value.encode("utf-8")
+    elif value_type is float:
+        tag, data = b"F", repr(value).encode("ascii")
+    else:
+        tag, data = b"I", str(value).encode("ascii")
+    return tag + str(len(data)).encode("ascii") + b":" + data
+
+
+class _CfgDiff(object):
+    """The differences between two CfgNodes a and b (see CfgNode.diff).
+
+    `added` maps the full keys of the leaves only in b to their values, `removed`
+    the full keys of the leaves only in a to their values, and `changed` the full
+    keys in both whose values differ (including by type) to (old, new) pairs.
+    """
+
+    def __init__(self):
+        self.added = collections.OrderedDict()
+        self.removed = collections.OrderedDict()
+        self.changed = collections.OrderedDict()
+
+    @property
+    def type_changed(self):
+        """The full keys in `changed` whose values changed type."""
+        return [
+            k for k, (old, new) in self.changed.items() if type(old) is not type(new)
+        ]
+
+    def to_override_list(self):
+        """
+        Return the changed values as an override list, which turns a into b when
+        passed to `a.merge_from_list`. Added and removed keys cannot be overridden
+        and are left out, as are the changes of type that `merge_from_list` cannot
+        make (e.g., from int to float, or from a sub-config to a value; see
+        `type_changed`).
+        """
+        cfg_list = []
+        for full_key, (old, new) in self.changed.items():
+            # merge_from_list would reject the value, or coerce it to another type
+            if _coerce_cfg_value(new, old) is not new:
+                continue
+            if isinstance(new, _STRING_TYPES) and _may_be_literal(new):
+                # Keep the string from being decoded as a literal
+                new = repr(new)
+            cfg_list.extend([full_key, new])
+        return cfg_list
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    __nonzero__ = __bool__
+
+    def __str__(self):
+        lines = ["+ {}: {!r}".format(k, v) for k, v in self.added.items()]
+        lines += ["- {}: {!r}".format(k, v) for k, v in self.removed.items()]
+        lines += [
+            "~ {}: {!r} -> {!r}".format(k, old, new)
+            for k, (old, new) in self.changed.items()
+        ]
+        return "\n".join(lines)
+
+
+def _diff_nodes(a, b, prefix, diff):
+    """Record the differences between the CfgNodes `a` and `b` at `prefix` in
+    `diff`. Children are read with dict methods, which leave borrowed sub-configs
+    borrowed (see CfgNode.clone).
+    """
+    if a is b:
+        return
+    digest = _memoized_fingerprint(a)
+    if digest is not None and digest == _memoized_fingerprint(b):
+        return
+    for node in (a, b):
+        if node.__dict__.get(CfgNode.LAZY, False):
+            node._materialize_children()
+    for k, old in dict.items(a):
+        full_key = prefix + str(k)
+        new = dict.get(b, k, _MISSING)
+        if new is _MISSING:
+            _add_leaves(old, full_key, diff.removed)
+        elif isinstance(old, CfgNode) and isinstance(new, CfgNode):
+            _diff_nodes(old, new, full_key + ".", diff)
+        elif old is not new and (type(old) is not type(new) or old != new):
+            diff.changed[full_key] = (old, new)
+    for k, new in dict.items(b):
+        if k not in a:
+            _add_leaves(new, prefix + str(k), diff.added)
+
+
+def _add_leaves(value, full_key, leaves):
+    """Add the leaves of `value` at `full_key` to the dict `leaves` by full key."""
+    if isinstance(value, CfgNode) and len(value) > 0:
+        for k, v in _items(value):
+            _add_leaves(v, full_key + "." + str(k), leaves)
+    else:
+        leaves[full_key] = value
+
+
+class _LRUCache(object):
+    """A thread-safe, bounded, least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                # Re-insert the entry to mark it as the most recently used one
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+
+# Cache of CfgNode._decode_cfg_value results keyed on the raw string
+_decode_cache = _LRUCache(max_size=4096)
+
+# Characters that can start a Python literal expression other than a name
+_LITERAL_START_CHARS = set("0123456789.+-'\"([{#\\")
+
+
+def _may_be_literal(value):
+    """Return False if `value` certainly cannot be evaluated by literal_eval,
+    e.g., names and paths. This is a conservative, cheap check.
+    """
+    s = value.lstrip()
+    if not s:
+        return False
+    if s[0] in _LITERAL_START_CHARS:
+        return True
+    if s[0].isalpha() or s[0] == "_":
+        # True, False, None or a string literal with a prefix (e.g., b'foo')
+        return s.startswith(("True", "False", "None")) or any(
+            c in "'\"" for c in s[1:3]
+        )
+    return False
+
+
+# Clock that orders all freeze() and defrost() calls; see _FrozenState
+_frozen_state_clock = itertools.count(1)
+
+
+def _sync_frozen_state_clock(stamp):
+    """Advance the clock past `stamp`, e.g. a stamp set by another process."""
+    global _frozen_state_clock
+    if stamp >= next(_frozen_state_clock):
+        _frozen_state_clock = itertools.count(stamp + 1)
+
+
+class _FrozenState(object):
+    """
+    Mutability of a CfgNode, linked to the mutability of the CfgNodes containing
+    it, so that whole config trees can be frozen or defrosted in O(1).
+
+    freeze()/defrost() on a CfgNode set its state, stamped with a clock tick, and
+    a CfgNode is frozen according to the most recent set that reaches its state
+    along the links to its parents. A link only passes on the sets made after it
+    was created (its `since` stamp), and a CfgNode contained in several CfgNodes has
+    a link to each of them. This matches applying each call recursively to the
+    CfgNodes in the tree at that time.
+
+    A state only refers weakly to its CfgNode (its owner). Once the owner is gone
+    (e.g., collected, or not copied along with a sub-config), no more sets can
+    reach the state, so the links to it are folded into the states linked to it.
+
+    A state also records the configs borrowing its CfgNode (see CfgNode.clone),
+    which get copies of it before it or a CfgNode containing it changes.
+    """
+
+    __slots__ = (
+        "parents",
+        "frozen",
+        "stamp",
+        "version",
+        "structure_version",
+        "owner",
+        "borrowers",
+    )
+
+    def __init__(self, owner=None):
+        # (state, since) pairs
+        self.parents = ()
+        self.frozen = False
+        self.stamp = 0
+        # Incremented whenever a value of the CfgNode or of a nested CfgNode changes
+        # (or may change, once defrosted or once a list is handed out), so that
+        # memoized fingerprints can detect that they are out of date
+        self.version = 0
+        # Incremented whenever a key is added to or removed from the CfgNode or a
+        # nested CfgNode, or a sub-config is replaced, so that key indices can
+        # detect that they are out of date
+        self.structure_version = 0
+        # States restored by pickle or deepcopy are bound by their CfgNode
+        self.owner = None if owner is None else weakref.ref(owner)
+        # Weakrefs to the CfgNodes borrowing the CfgNode
+        self.borrowers = ()
+
+    def bind(self, owner):
+        self.owner = weakref.ref(owner)
+
+    def has_owner(self):
+        return self.owner is not None and self.owner() is not None
+
+    def set(self, frozen):
+        self.frozen = frozen
+        self.stamp = next(_frozen_state_clock)
+
+    def get(self, since=0):
+        """Return the (stamp, frozen) pair of the most recent set after `since`
+        that applies to this state, or (0, False) if there is none.
+        """
+        stamp, frozen = 0, False
+        state = self
+        while True:
+            if state.stamp > since and state.stamp > stamp:
+                stamp, frozen = state.stamp, state.frozen
+            parents = state.parents
+            if len(parents) != 1:
+                break
+            state, link_since = parents[0]
+            if link_since > since:
+                since = link_since
+        has_dead_parents = False
+        for parent, link_since in parents:
+            parent_stamp, parent_frozen = parent.get(max(since, link_since))
+            if parent_stamp > stamp:
+                stamp, frozen = parent_stamp, parent_frozen
+            has_dead_parents = has_dead_parents or not parent.has_owner()
+        if has_dead_parents:
+            state.prune()
+        return stamp, frozen
+
+    def changed(self, structure=False):
+        """Record a change of the CfgNode, and return whether it or a CfgNode
+        containing it is borrowed.
+        """
+        self.version += 1
+        if structure:
+            self.structure_version += 1
+        is_lent = bool(self.borrowers)
+        has_dead_parents = False
+        for parent, _ in self.parents:
+            if parent.has_owner():
+                is_lent = parent.changed(structure) or is_lent
+            else:
+                has_dead_parents = True
+        if has_dead_parents:
+            self.prune()
+        return is_lent
+
+    def lend(self, borrower):
+        """Record that the CfgNode `borrower` borrows the CfgNode."""
+        # The weakref is created once per borrower (weakrefs without callback are
+        # reused by CPython)
+        entry = weakref.ref(borrower)
+        if not self.borrowers:
+            # Most states are never lent, and keep the shared empty tuple
+            self.borrowers = [entry]
+            return
+        self.borrowers.append(entry)
+        # Drop the configs that no longer borrow the CfgNode when the number of
+        # borrowers doubles, as for links
+        num_borrowers = len(self.borrowers)
+        if num_borrowers >= 8 and num_borrowers & (num_borrowers - 1) == 0:
+            node = self.owner()
+            self.borrowers = [
+                ref for ref in self.borrowers if _borrowed_keys(ref(), node)
+            ]
+
+    def lent_state(self):
+        """Return the topmost borrowed state among this state and the states it
+        is linked to, or None.
+        """
+        lent_state = None
+        state = self
+        while True:
+            if state.borrowers:
+                lent_state = state
+            parents = state.parents
+            if len(parents) != 1:
+                break
+            state = parents[0][0]
+        # The states of CfgNodes that are gone have no live borrowers (borrowers
+        # hold the CfgNodes they borrow), so walking them is harmless
+        for parent, _ in parents:
+            parent_lent_state = parent.lent_state()
+            if parent_lent_state is not None:
+                return parent_lent_state
+        return lent_state
+
+    def link(self, parent, since):
+        self.parents += ((parent, since),)
+        # Prune when the number of links doubles, so that a CfgNode added to many
+        # short-lived configs keeps O(1) amortized links per live config
+        num_links = len(self.parents)
+        if num_links >= 8 and num_links & (num_links - 1) == 0:
+            self.prune()
+
+    def unlink(self, parent):
+        """Remove the link to `parent`, keeping the current mutability."""
+        links = [i for i, (state, _) in enumerate(self.parents) if state is parent]
+        if not links:
+            return
+        # When contained twice in the same CfgNode, the earliest link remains
+        i = max(links, key=lambda i: self.parents[i][1])
+        self._fold(parent, self.parents[i][1])
+        self.parents = self.parents[:i] + self.parents[i + 1 :]
+
+    def prune(self):
+        """Remove the links to the states of CfgNodes that are gone, keeping the
+        current mutability.
+        """
+        parents = self.parents
+        live_parents = tuple(link for link in parents if link[0].has_owner())
+        if len(live_parents) == len(parents):
+            return
+        for parent, since in parents:
+            if not parent.has_owner():
+                self._fold(parent, since)
+        self.parents = live_parents
+
+    def _fold(self, parent, since):
+        # Keep the most recent set passed on by the link (with its stamp, to compare
+        # it with the sets of the nested CfgNodes that remain linked to this state)
+        stamp, frozen = parent.get(since)
+        if stamp > self.stamp:
+            self.stamp, self.frozen = stamp, frozen
+
+    def has_ancestor(self, state):
+        if self is state:
+            return True
+        return any(parent.has_ancestor(state) for parent, _ in self.parents)
+
+    def __getstate__(self):
+        self.prune()
+        # Versions are only compared with the versions of memos of this process
+        return {"parents": self.parents, "frozen": self.frozen, "stamp": self.stamp}
+
+    def __deepcopy__(self, memo):
+        self.prune()
+        # Borrowers of the copy register themselves
+        state = _FrozenState()
+        memo[id(self)] = state
+        state.parents = tuple(
+            (copy.deepcopy(parent, memo), since) for parent, since in self.parents
+        )
+        state.frozen = self.frozen
+        state.stamp = self.stamp
+        return state
+
+    def __setstate__(self, state):
+        self.version = self.structure_version = 0
+        self.owner = None
+        self.borrowers = ()
+        for k, v in state.items():
+            setattr(self, k, v)
+        # Stamps set by another process must not be more recent than local sets
+        _sync_frozen_state_clock(
+            max([self.stamp] + [since for _, since in self.parents])
+        )
+
+
+def _attach_frozen_state(node, parent, since=None):
+    """Make the CfgNode `node`, which is being added to the CfgNode `parent`,
+    follow the mutability of `parent` from now on (or, if given, after the stamp
+    `since`). Its current mutability is kept.
+    """
+    state = node.__dict__[CfgNode.IMMUTABLE]
+    parent_state = parent.__dict__[CfgNode.IMMUTABLE]
+    if parent_state.has_ancestor(state):
+        # Adding a CfgNode to itself; there is no well-defined parent state
+        return
+    if since is None:
+        # The sets made so far do not apply to `node`
+        since = next(_frozen_state_clock)
+    state.link(parent_state, since)
+
+
+def _detach_frozen_state(node, parent):
+    """Stop the CfgNode `node`, which is being removed from the CfgNode `parent`,
+    from following the mutability of `parent`. Its current mutability is kept.
+    """
+    node.__dict__[CfgNode.IMMUTABLE].unlink(parent.__dict__[CfgNode.IMMUTABLE])
+
+
+def _index_keys(node, prefix, entries):
+    shared_keys = node.__dict__.get(CfgNode.SHARED, _NO_SHARED_KEYS)
+    for k, v in _items(node):
+        # Keys that `full_key.split(".")` cannot produce are not indexed
+        if not isinstance(k, str) or "." in k:
+            continue
+        full_key = prefix + k
+        entries[full_key] = (node, k)
+        # The keys of a borrowed CfgNode can change without changing this tree
+        if isinstance(v, CfgNode) and k not in shared_keys:
+            _index_keys(v, full_key + ".", entries)
+
+
+def _valid_type(value, allow_cfg_node=False):
+    return (type(value) in _VALID_TYPES) or (
+        allow_cfg_node and isinstance(value, CfgNode)
+    )
+
+
+def _snapshot_encode(node, path, meta):
+    """Convert the CfgNode `node` at `path` to nested dicts for a snapshot. The
+    non-default flags and registries of each CfgNode are recorded in `meta`.
+    """
+    tree = {}
+    for k, v in _items(node):
+        if isinstance(v, CfgNode):
+            tree[k] = _snapshot_encode(v, path + (k,), meta)
+        else:
+            _assert_with_logging(
+                _valid_type(v),
+                "Key {} with value {} is not a valid type; valid types: {}".format(
+                    ".".join(str(p) for p in path + (k,)), type(v), _VALID_TYPES
+                ),
+            )
+            tree[k] = v
+    new_allowed = node.is_new_allowed()
+    deprecated_keys = node.__dict__[CfgNode.DEPRECATED_KEYS]
+    renamed_keys = node.__dict__[CfgNode.RENAMED_KEYS]
+    if new_allowed or deprecated_keys or renamed_keys:
+        meta[path] = (new_allowed, set(deprecated_keys), dict(renamed_keys))
+    return tree
+
+
+def _snapshot_to_bytes(cfg):
+    meta = {}
+    tree = _snapshot_encode(cfg, (), meta)
+    payload = marshal.dumps((tree, meta))
+    header = _SNAPSHOT_HEADER.pack(
+        _SNAPSHOT_MAGIC,
+        _SNAPSHOT_VERSION,
+        sys.version_info.major,
+        marshal.version,
+        zlib.crc32(payload) & 0xFFFFFFFF,
+    )
+    return header + payload
+
+
+class _CfgFileCache(object):
+    """An on-disk cache of configs parsed from files that can be shared by many
+    processes.
+
+    Entries are snapshots (see CfgNode.save_snapshot) named after a hash of the
+    path, size, mtime and content of the parsed file, so an edited file is parsed
+    again. Entries are written to a temporary file and renamed into place, so
+    concurrent readers never see a partially written entry. When the cache grows
+    over `max_bytes`, the least recently used entries are removed.
+    """
+
+    ENTRY_EXT = ".snap"
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                raise
+
+    def load(self, cls, filename, content, parse_fn, lazy=False):
+        """Load the config parsed from `filename`, whose raw content is `content`,
+        from the cache, or parse it with `parse_fn` and store it in the cache.
+        """
+        entry = self._entry_path(filename, content)
+        try:
+            with open(entry, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            data = None
+        if data is not None:
+            try:
+                cfg = cls._load_snapshot_bytes(data, entry, lazy)
+            except (AssertionError, ValueError, EOFError):
+                logger.debug("Ignoring invalid config cache entry {}".format(entry))
+            else:
+                try:
+                    # The mtime of an entry records when it was last used
+                    os.utime(entry, None)
+                except OSError:
+                    pass
+                return cfg
+        cfg = parse_fn()
+        self._store(entry, cfg)
+        return cfg
+
+    def _entry_path(self, filename, content):
+        filename = os.path.realpath(filename)
+        st = os.stat(filename)
+        key = hashlib.sha1()
+        for part in (
+            filename,
+            str(st.st_size),
+            repr(st.st_mtime),
+            "py{}.{}".format(*sys.version_info[:2]),
+        ):
+            key.update(part.encode("utf-8"))
+            key.update(b"\0")
+        key.update(hashlib.sha1(content).digest())
+        return os.path.join(self.cache_dir, key.hexdigest() + self.ENTRY_EXT)
+
+    def _store(self, entry, cfg):
+        fd, tmp_filename = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_snapshot_to_bytes(cfg))
+            os.rename(tmp_filename, entry)
+        except (IOError, OSError):
+            # E.g., on Windows, another process has just stored the same entry
+            logger.debug("Could not store config cache entry {}".format(entry))
+            try:
+                os.remove(tmp_filename)
+            except OSError:
+                pass
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total_bytes = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.ENTRY_EXT):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Removed by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total_bytes += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_bytes -= size
+
+
+# Cache used by CfgNode.load_cfg for YAML and Python config files; see set_cfg_cache
+_cfg_cache = None
+
+
+def set_cfg_cache(cache_dir, max_size_mb=256):
+    """
+    Enable an on-disk cache of the configs loaded from YAML and Python files (e.g.,
+    by `merge_from_file`) in `cache_dir`, or disable it if `cache_dir` is None.
+
+    A cached config is used as long as the size, mtime and content of its file are
+    unchanged; note that Python config files are then not executed. The cache can
+    be shared by concurrent processes, and the least recently used configs are
+    removed when it grows over `max_size_mb`.
+    """
+    global _cfg_cache
+    if cache_dir is None:
+        _cfg_cache = None
+    else:
+        _cfg_cache = _CfgFileCache(cache_dir, int(max_size_mb * 1024 * 1024))
+
+
+# Functions timed when profiling is enabled, as (owner, attribute, timer name)
+_PROFILED_FUNCTIONS = [
+    (CfgNode, "load_cfg", "load_cfg"),
+    (CfgNode, "merge_from_file", "merge_from_file"),
+    (CfgNode, "merge_from_other_cfg", "merge_from_other_cfg"),
+    (CfgNode, "merge_from_list", "merge_from_list"),
+    (CfgNode, "clone", "clone"),
+    (CfgNode, "freeze", "freeze"),
+    (CfgNode, "dump", "dump"),
+    (CfgNode, "dump_to", "dump_to"),
+    (sys.modules[__name__], "_parse_yaml", "yaml_parse"),
+    (sys.modules[__name__], "_emit_yaml", "yaml_emit"),
+    (_YamlStreamEmitter, "emit_document", "yaml_emit"),
+]
+
+_profile_clock = getattr(time, "perf_counter", time.time)
+# Original functions replaced while profiling is enabled, by (owner, attribute)
+_profile_originals = {}
+# Number of calls and total time of the timed functions, by timer name
+_profile_timings = {}
+# Weak reference to a CfgNode and number of reads by key, by id of the CfgNode
+_profile_key_reads = {}
+
+
+def enable_profiling(key_reads=True):
+    """
+    Start recording the number of calls and total time of the main CfgNode methods
+    (loading, merging, cloning, freezing and dumping) and of YAML parsing and
+    emitting, and, if `key_reads` is True, the number of times each key of each
+    CfgNode is read by attribute or item access. See `get_profile`.
+
+    Profiling replaces these methods, so it costs nothing when disabled. Reads by
+    yacs itself (e.g., by merges) are counted too; call `reset_profile` once the
+    config is set up to only count the reads of the code using it.
+    """
+    disable_profiling()
+    for owner, attr, name in _PROFILED_FUNCTIONS:
+        original = owner.__dict__[attr]
+        _profile_originals[(owner, attr)] = original
+        if isinstance(original, classmethod):
+            timed = classmethod(_timed(original.__func__, name))
+        else:
+            timed = _timed(original, name)
+        setattr(owner, attr, timed)
+    if key_reads:
+        for attr, wrap in [
+            ("__getattr__", _counting_getattr),
+            ("__getitem__", _counting_getitem),
+            ("get", _counting_get),
+        ]:
+            original = CfgNode.__dict__[attr]
+            _profile_originals[(CfgNode, attr)] = original
+            setattr(CfgNode, attr, wrap(original))
+
+
+def disable_profiling():
+    """Stop profiling; the data recorded so far is kept until `reset_profile`."""
+    for (owner, attr), original in _profile_originals.items():
+        setattr(owner, attr, original)
+    _profile_originals.clear()
+
+
+def is_profiling_enabled():
+    return len(_profile_originals) > 0
+
+
+def reset_profile():
+    """Discard the data recorded by profiling."""
+    _profile_timings.clear()
+    _profile_key_reads.clear()
+
+
+def get_profile(cfg=None):
+    """
+    Return the data recorded by profiling as a dict that can be serialized to
+    JSON, with keys:
+        - "timings": the number of "calls" and total "seconds" spent in each timed
+          function. Times include the timed functions called by another one, e.g.,
+          "merge_from_file" includes "load_cfg", which includes "yaml_parse".
+    and, if the CfgNode `cfg` is given:
+        - "key_reads": the number of reads of each key of `cfg` read at least once,
+          by full key.
+        - "unread_keys": the sorted full keys of the leaves of `cfg` that were never
+          read, e.g., to find the options that can be removed from a config.
+    Reads are counted per CfgNode object: the reads of a clone of `cfg` are not
+    reads of `cfg`, and neither are reads from its view or frozen struct.
+    """
+    profile = {
+        "timings": {
+            name: {"calls": calls, "seconds": seconds}
+            for name, (calls, seconds) in sorted(_profile_timings.items())
+        }
+    }
+    if cfg is not None:
+        key_reads = collections.OrderedDict()
+        unread_keys = []
+        _collect_key_reads(cfg, "", key_reads, unread_keys)
+        profile["key_reads"] = key_reads
+        profile["unread_keys"] = sorted(unread_keys)
+    return profile
+
+
+def _timed(fn, name):
+    def timed(*args, **kwargs):
+        start = _profile_clock()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stats = _profile_timings.get(name)
+            if stats is None:
+                stats = _profile_timings[name] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += _profile_clock() - start
+
+    timed.__name__ = fn.__name__
+    timed.__doc__ = fn.__doc__
+    return timed
+
+
+def _record_key_read(node, key):
+    entry = _profile_key_reads.get(id(node))
+    if entry is None or entry[0]() is not node:
+        # New CfgNode, or a collected one whose id was reused
+        entry = _profile_key_reads[id(node)] = (weakref.ref(node), {})
+    counts = entry[1]
+    counts[key] = counts.get(key, 0) + 1
+
+
+def _counting_getattr(getattr_fn):
+    def __getattr__(self, name):
+        value = getattr_fn(self, name)
+        if not isinstance(value, CfgNode):
+            # Sub-configs are read through __getitem__, which records the read
+            _record_key_read(self, name)
+        return value
+
+    return __getattr__
+
+
+def _counting_getitem(getitem_fn):
+    def __getitem__(self, key):
+        value = getitem_fn(self, key)
+        _record_key_read(self, key)
+        return value
+
+    return __getitem__
+
+
+def _counting_get(get_fn):
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            _record_key_read(self, key)
+        return get_fn(self, key, default)
+
+    return get
+
+
+def _collect_key_reads(node, prefix, key_reads, unread_keys):
+    entry = _profile_key_reads.get(id(node))
+    counts = entry[1] if entry is not None and entry[0]() is node else {}
+    for k, v in dict.items(node):
+        full_key = prefix + str(k)
+        reads = counts.get(k, 0)
+        if reads > 0:
+            key_reads[full_key] = reads
+        if isinstance(v, dict):
+            # CfgNode, or _LazyDict of which no key was read as it is not materialized
+            _collect_key_reads(v, full_key + ".", key_reads, unread_keys)
+        elif reads == 0:
+            unread_keys.append(full_key)
+
+
+class CfgStack(object):
+    """
+    A config made of layers merged in order: `defaults`, then each layer pushed
+    with `push` (e.g., a base file, an experiment file, then command line
+    overrides). A layer is a CfgNode or dict, the name of a config file, or an
+    override list for `merge_from_list` (e.g. ['FOO.BAR', 0.5]).
+
+    The merged config of every prefix of the stack is cached (frozen), so when a
+    layer is replaced with `set_layer`, only the layers above it are merged again,
+    into a copy-on-write clone of the config below it; only the sub-configs they
+    touch are copied. `get()` returns the merged config and `source(full_key)` the
+    name of the layer that supplied a key. The defaults layer is named "defaults".
+    """
+
+    DEFAULTS = "defaults"
+
+    def __init__(self, defaults):
+        self._cls = type(defaults) if isinstance(defaults, CfgNode) else CfgNode
+        self._names = [CfgStack.DEFAULTS]
+        self._layers = [self._to_layer(CfgStack.DEFAULTS, defaults)]
+        self._leaves = [self._get_leaves(self._layers[0])]
+        # _merged[i] is the merged config of the first i + 1 layers
+        self._merged = [self._layers[0]]
+
+    def push(self, name, layer):
+        """Add `layer` named `name` on top of the stack."""
+        _assert_with_logging(
+            name not in self._names, "Layer {} is already in the stack".format(name)
+        )
+        layer = self._to_layer(name, layer)
+        merged = self._merge_layers([layer], self._merged[-1:], [name])
+        self._names.append(name)
+        self._layers.append(layer)
+        self._leaves.append(self._get_leaves(layer))
+        self._merged.append(merged[-1])
+
+    def set_layer(self, name, layer):
+        """Replace the layer named `name` with `layer`."""
+        self.set_layers({name: layer})
+
+    def set_layers(self, layers):
+        """Replace the layers named by the keys of the dict `layers` with its values,
+        merging the stack again once.
+        """
+        for name in layers:
+            _assert_with_logging(
+                name in self._names, "Layer {} is not in the stack".format(name)
+            )
+        new_layers = list(self._layers)
+        for name, layer in layers.items():
+            new_layers[self._names.index(name)] = self._to_layer(name, layer)
+        start = min(self._names.index(name) for name in layers)
+        if start == 0:
+            merged = [new_layers[0]]
+            start = 1
+        else:
+            merged = self._merged[:start]
+        merged = self._merge_layers(new_layers[start:], merged, self._names[start:])
+        for i, layer in enumerate(new_layers):
+            if layer is not self._layers[i]:
+                self._leaves[i] = self._get_leaves(layer)
+        self._layers, self._merged = new_layers, merged
+
+    def layer_names(self):
+        """Return the names of the layers, from the bottom to the top."""
+        return list(self._names)
+
+    def get(self):
+        """Return the merged config (frozen)."""
+        cfg = self._merged[-1].clone(copy_on_write=True)
+        cfg.freeze()
+        return cfg
+
+    def source(self, full_key):
+        """Return the name of the layer that supplied the key `full_key`."""
+        # Fail for keys missing from the merged config
+        self._merged[-1]._find_key(full_key)
+        for name, leaves in zip(reversed(self._names), reversed(self._leaves)):
+            if full_key in leaves:
+                return name
+        # `full_key` is a sub-config: report the top layer that supplied its keys
+        prefix = full_key + "."
+        for name, leaves in zip(reversed(self._names), reversed(self._leaves)):
+            if any(k.startswith(prefix) for k in leaves):
+                return name
+        return CfgStack.DEFAULTS
+
+    def _to_layer(self, name, layer):
+        """Convert `layer` to a frozen CfgNode."""
+        if isinstance(layer, _STRING_TYPES):
+            layer = _load_cfg_file((self._cls, layer))
+        elif isinstance(layer, (list, tuple)):
+            layer = self._cls(_override_list_to_dict(layer))
+        elif isinstance(layer, CfgNode):
+            layer = layer.clone()
+        else:
+            layer = self._cls(layer)
+        layer.freeze()
+        return layer
+
+    def _get_leaves(self, layer):
+        leaves = {}
+        for k, v in _items(layer):
+            _add_leaves(v, str(k), leaves)
+        return leaves
+
+    def _merge_layers(self, layers, merged, names):
+        """Extend `merged`, the merged configs of the first layers, with `layers`."""
+        merged = list(merged)
+        for name, layer in zip(names, layers):
+            cfg = merged[-1].clone(copy_on_write=True)
+            cfg.defrost()
+            try:
+                cfg.merge_from_other_cfg(layer)
+            except (AssertionError, KeyError, ValueError) as e:
+                raise _exception_with_filename(e, name)
+            cfg.freeze()
+            merged.append(cfg)
+        return merged
+
+
+def _override_list_to_dict(cfg_list):
+    """Convert an override list (see CfgNode.merge_from_list) to nested dicts."""
+    _assert_with_logging(
+        len(cfg_list) % 2 == 0,
+        "Override list has odd length: {}; it must be a list of pairs".format(
+            cfg_list
+        ),
+    )
+    d = {}
+    for full_key, v in zip(cfg_list[0::2], cfg_list[1::2]):
+        key_list = full_key.split(".")
+        node = d
+        for k in key_list[:-1]:
+            node = node.setdefault(k, {})
+            _assert_with_logging(
+                isinstance(node, dict),
+                "Override of {} conflicts with another override".format(full_key),
+            )
+        node[key_list[-1]] = v
+    return d
+
+
+class CfgWatcher(object):
+    """
+    Keep a config merged from a list of files up to date as the files change, e.g.
+    in a long running service.
+
+    The config is `cfg` with the files `cfg_filenames` merged in order (as by
+    `merge_from_file`), and `get()` returns it as a frozen CfgNode. `check()` polls
+    the mtime and size of the files, which `start()` does every `interval` seconds
+    in a background thread. The files are the layers of a CfgStack, so only changed
+    files are parsed again, and the config is merged again from the first changed
+    file on; the configs merged from the files before it are reused. A file is only
+    reloaded once it has not changed for `debounce` seconds (editors often write
+    files in several steps).
+
+    A new config is fully merged and frozen before `get()` returns it, so readers
+    never see a partially merged config. If a file cannot be loaded or merged, the
+    error is logged and the previous config is kept. After a reload,
+    `callback(cfg, changed_keys)` is called with the new config and the sorted
+    full keys that were added, removed or changed.
+    """
+
+    def __init__(self, cfg, cfg_filenames, callback=None, interval=1.0, debounce=0.5):
+        self.cfg_filenames = list(cfg_filenames)
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._stamps = self._get_stamps()
+        self._pending = (None, None)
+        self._failed_stamps = None
+        self._stack = CfgStack(cfg)
+        for filename in self.cfg_filenames:
+            self._stack.push(filename, filename)
+        self._cfg = self._stack.get()
+
+    def get(self):
+        """Return the current config, a frozen CfgNode."""
+        return self._cfg
+
+    def check(self):
+        """Reload the config if its files changed, and return whether it did."""
+        with self._lock:
+            stamps = self._get_stamps()
+            if stamps == self._stamps or stamps == self._failed_stamps:
+                return False
+            if stamps != self._pending[0]:
+                # Wait for the files to stop changing
+                self._pending = (stamps, time.time())
+                if self.debounce > 0:
+                    return False
+            elif time.time() - self._pending[1] < self.debounce:
+                return False
+            return self._reload(stamps)
+
+    def start(self):
+        """Check the files for changes every `interval` seconds in a thread."""
+        _assert_with_logging(self._thread is None, "CfgWatcher is already started")
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread started by `start`."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.check()
+
+    def _get_stamps(self):
+        stamps = []
+        for filename in self.cfg_filenames:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                stamps.append(None)
+            else:
+                stamps.append((st.st_mtime, st.st_size))
+        return stamps
+
+    def _reload(self, stamps):
+        changed = [
+            f for f, s, old in zip(self.cfg_filenames, stamps, self._stamps) if s != old
+        ]
+        try:
+            # Files are loaded again as they are passed by name
+            self._stack.set_layers({f: f for f in changed})
+        except Exception:
+            logger.exception("Failed to reload the config; keeping the previous one")
+            self._failed_stamps = stamps
+            return False
+        self._stamps = stamps
+        old_cfg = self._cfg
+        self._cfg = self._stack.get()
+        if self.callback is not None:
+            diff = old_cfg.diff(self._cfg)
+            changed_keys = sorted(
+                itertools.chain(diff.added, diff.removed, diff.changed)
+            )
+            try:
+                self.callback(self._cfg, changed_keys)
+            except Exception:
+                logger.exception("CfgWatcher callback failed")
+        return True
+
+
+def unlink_shared(name):
+    """Remove a config published in shared memory by `CfgNode.publish_shared`.
+    Processes that are attached to it can still use it.
+    """
+    path = _shared_cfg_path(name)
+    os.remove(path)
+    _shared_buffers.pop(path, None)
+
+
+def _shared_cfg_path(name):
+    if os.path.dirname(name):
+        return name
+    shm_dir = "/dev/shm"
+    if not os.path.isdir(shm_dir):
+        shm_dir = tempfile.gettempdir()
+    return os.path.join(shm_dir, "yacs-" + name)
+
+
+# Buffers of the shared configs attached to by this process, by path
+_shared_buffers = {}
+
+
+def _attach_shared_view(path, offset):
+    st = os.stat(path)
+    file_id = (st.st_ino, st.st_size, st.st_mtime)
+    cached = _shared_buffers.get(path)
+    if cached is not None and cached[0] == file_id:
+        buf = cached[1]
+    else:
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _assert_with_logging(
+            len(buf) >= _SHARED_HEADER.size
+            and buf[: len(_SHARED_MAGIC)] == _SHARED_MAGIC,
+            "File {} is not a shared CfgNode".format(path),
+        )
+        _assert_with_logging(
+            _SHARED_HEADER.unpack_from(buf)[1] == sys.version_info.major,
+            "Shared CfgNode {} was published by an incompatible Python version".format(
+                path
+            ),
+        )
+        _shared_buffers[path] = (file_id, buf)
+    if offset is None:
+        offset = _SHARED_HEADER.unpack_from(buf)[2]
+    return _SharedCfgView(buf, offset, path)
+
+
+class _SharedCfgWriter(object):
+    """Encode a CfgNode in the shared config format (see _SHARED_MAGIC)."""
+
+    def __init__(self):
+        self.buf = bytearray(_SHARED_HEADER.size)
+
+    def to_bytes(self, cfg):
+        root = self._write_node(cfg, [])
+        _SHARED_HEADER.pack_into(
+            self.buf, 0, _SHARED_MAGIC, sys.version_info.major, root
+        )
+        return bytes(self.buf)
+
+    def _append(self, data):
+        offset = len(self.buf)
+        self.buf += data
+        return offset
+
+    def _write_node(self, node, key_list):
+        entries = []
+        for k, v in _items(node):
+            full_key = ".".join(key_list + [str(k)])
+            _assert_with_logging(
+                isinstance(k, _STRING_TYPES),
+                "Key {} is not a string and cannot be shared".format(full_key),
+            )
+            key = k if isinstance(k, bytes) else k.encode("utf-8")
+            key_offset = self._append(key)
+            if isinstance(v, CfgNode):
+                value = (_SHARED_NODE, self._write_node(v, key_list + [k]), 0)
+            else:
+                _assert_with_logging(
+                    _valid_type(v),
+                    "Key {} with value {} is not a valid type; valid types: {}".format(
+                        full_key, type(v), _VALID_TYPES
+                    ),
+                )
+                value = self._write_value(v)
+            entries.append((key, key_offset) + value)
+        offset = self._append(_SHARED_COUNT.pack(len(entries)))
+        for key, key_offset, kind, value, size in entries:
+            self.buf += _SHARED_ENTRY.pack(key_offset, len(key), kind, value, size)
+        for i in sorted(range(len(entries)), key=lambda i: entries[i][0]):
+            self.buf += _SHARED_COUNT.pack(i)
+        return offset
+
+    def _write_value(self, v):
+        value_type = type(v)
+        if v is None:
+            return _SHARED_NONE, 0, 0
+        if value_type is bool:
+            return _SHARED_BOOL, int(v), 0
+        if value_type is int and -(2 ** 63) <= v < 2 ** 63:
+            return _SHARED_INT, v, 0
+        if value_type is float:
+            bits = _SHARED_INT64.unpack(_SHARED_DOUBLE.pack(v))[0]
+            return _SHARED_FLOAT, bits, 0
+        if value_type is str:
+            try:
+                data = v if _PY2 else v.encode("utf-8")
+            except UnicodeEncodeError:
+                # E.g., lone surrogates, which marshal supports
+                pass
+            else:
+                return _SHARED_STR, self._append(data), len(data)
+        data = marshal.dumps(v)
+        return _SHARED_MARSHAL, self._append(data), len(data)
+
+
+class _SharedCfgView(object):
+    """A read-only view of a CfgNode published in shared memory (see
+    CfgNode.publish_shared), which decodes keys and values from the shared buffer
+    when they are accessed.
+    """
+
+    __slots__ = ("_buf", "_offset", "_path")
+
+    def __init__(self, buf, offset, path):
+        object.__setattr__(self, "_buf", buf)
+        object.__setattr__(self, "_offset", offset)
+        object.__setattr__(self, "_path", path)
+
+    def _entry(self, i):
+        return _SHARED_ENTRY.unpack_from(
+            self._buf, self._offset + _SHARED_COUNT.size + i * _SHARED_ENTRY.size
+        )
+
+    def _key(self, entry):
+        key = self._buf[entry[0] : entry[0] + entry[1]]
+        return key if _PY2 else key.decode("utf-8")
+
+    def _value(self, entry):
+        kind, value, size = entry[2:]
+        if kind == _SHARED_NODE:
+            return _SharedCfgView(self._buf, value, self._path)
+        if kind == _SHARED_STR:
+            data = self._buf[value : value + size]
+            return data if _PY2 else data.decode("utf-8")
+        if kind == _SHARED_INT:
+            return value
+        if kind == _SHARED_FLOAT:
+            return _SHARED_DOUBLE.unpack(_SHARED_INT64.pack(value))[0]
+        if kind == _SHARED_BOOL:
+            return bool(value)
+        if kind == _SHARED_NONE:
+            return None
+        return marshal.loads(self._buf[value : value + size])
+
+    def _find(self, key):
+        if not isinstance(key, _STRING_TYPES):
+            return None
+        key = key if isinstance(key, bytes) else key.encode("utf-8")
+        buf = self._buf
+        n = _SHARED_COUNT.unpack_from(buf, self._offset)[0]
+        order_offset = self._offset + _SHARED_COUNT.size + n * _SHARED_ENTRY.size
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = _SHARED_COUNT.unpack_from(buf, order_offset + mid * 4)[0]
+            entry = self._entry(i)
+            k = buf[entry[0] : entry[0] + entry[1]]
+            if k < key:
+                lo = mid + 1
+            elif k > key:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def __getattr__(self, name):
+        entry = self._find(name)
+        if entry is None:
+            raise AttributeError(name)
+        return self._value(entry)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            "Attempted to set {} to {}, but CfgNode is immutable".format(name, value)
+        )
+
+    def __getitem__(self, key):
+        entry = self._find(key)
+        if entry is None:
+            raise KeyError(key)
+        return self._value(entry)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __len__(self):
+        return _SHARED_COUNT.unpack_from(self._buf, self._offset)[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._key(self._entry(i))
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self._value(self._entry(i)) for i in range(len(self))]
+
+    def items(self):
+        entries = [self._entry(i) for i in range(len(self))]
+        return [(self._key(e), self._value(e)) for e in entries]
+
+    def get(self, key, default=None):
+        entry = self._find(key)
+        return default if entry is None else self._value(entry)
+
+    def is_frozen(self):
+        return True
+
+    def clone(self):
+        """Return a frozen CfgNode with the content of this view."""
+
+        def to_dict(view):
+            return {
+                k: to_dict(v) if isinstance(v, _SharedCfgView) else v
+                for k, v in view.items()
+            }
+
+        cfg = CfgNode(to_dict(self))
+        cfg.freeze()
+        return cfg
+
+    def dump(self, **kwargs):
+        return self.clone().dump(**kwargs)
+
+    def __eq__(self, other):
+        if not isinstance(other, (dict, _SharedCfgView)) or len(other) != len(self):
+            return False
+        for k, v in self.items():
+            if k not in other or not v == other[k]:
+                return False
+        return True
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __str__(self):
+        return str(self.clone())
+
+    def __repr__(self):
+        return repr(self.clone())
+
+    def __reduce__(self):
+        return _attach_shared_view, (self._path, self._offset)
+
+
+def _is_immutable_leaf(value):
+    value_type = type(value)
+    if value_type in _IMMUTABLE_TYPES:
+        return True
+    if value_type is tuple:
+        return all(_is_immutable_leaf(v) for v in value)
+    return False
+
+
+def _is_mutable_leaf(value):
+    """Return whether a value stored in a CfgNode is a leaf that can be modified in
+    place (e.g., a list). This is faster than `_is_immutable_leaf` for tuples.
+    """
+    value_type = type(value)
+    if value_type is tuple:
+        return not (
+            _IMMUTABLE_TYPES.issuperset(map(type, value)) or _is_immutable_leaf(value)
+        )
+    return value_type is list
+
+
+def _copy_leaf(value):
+    """Return a copy of a leaf value that is safe to store in a CfgNode. Immutable
+    values (e.g., str, int or a tuple of those) are returned without copying.
+    """
+    if _is_immutable_leaf(value):
+        return value
+    return copy.deepcopy(value)
+
+
+def _copy_decoded_value(value):
+    """Return a copy of a value decoded by literal_eval with new containers, even
+    immutable ones: a tuple stored at several keys would be dumped as a YAML alias.
+    """
+    value_type = type(value)
+    if value_type in (tuple, list, set, frozenset):
+        return value_type(_copy_decoded_value(v) for v in value)
+    if value_type is dict:
+        return {k: _copy_decoded_value(v) for k, v in value.items()}
+    return value
+
+
+def _merge_a_into_b(a, b, root, key_list):
+    """Merge config dictionary a into config dictionary b, clobbering the
+    options in b whenever they are also specified in a.
+    """
+    # Error messages are only formatted when a check fails
+    if not isinstance(a, CfgNode):
+        _assert_with_logging(
+            False,
+            "`a` (cur type {}) must be an instance of {}".format(type(a), CfgNode),
+        )
+    if not isinstance(b, CfgNode):
+        _assert_with_logging(
+            False,
+            "`b` (cur type {}) must be an instance of {}".format(type(b), CfgNode),
+        )
+
+    # `a` and the values of `b` are only read (lists are not handed out)
+    for k, v_ in _items(a):
+        if k in b:
+            original = _get_child_for_read(b, k)
+            if isinstance(v_, CfgNode) and type(original) is type(b):
+                # Recursively merge dicts; `a` is only read, so its subtree is
+                # walked in place instead of being copied and decoded first
+                _merge_a_into_b(
+                    v_, _get_child_for_update(b, k), root, key_list + [k]
+                )
+                continue
+            v = _decode_or_copy_value(b, v_)
+            coerced = _coerce_cfg_value(v, original)
+            if coerced is _MISSING:
+                # Raises the type mismatch error
+                full_key = ".".join(key_list + [k])
+                _check_and_coerce_cfg_value_type(v, original, k, full_key)
+            v = coerced
+            # Recursively merge dicts (`a` may hold plain dicts)
+            if isinstance(v, CfgNode):
+                _merge_a_into_b(v, _get_child_for_update(b, k), root, key_list + [k])
+            else:
+                b[k] = v
+        elif b.is_new_allowed():
+            b[k] = _decode_or_copy_value(b, v_)
+        else:
+            full_key = ".".join(key_list + [k])
+            if root.key_is_deprecated(full_key):
+                continue
+            elif root.key_is_renamed(full_key):
+                root.raise_key_rename_error(full_key)
+            else:
+                raise KeyError("Non-existent config key: {}".format(full_key))
+
+
+class _OverridePlan(object):
+    """Overrides of a fixed list of keys compiled by CfgNode.compile_overrides."""
+
+    def __init__(self, cfg, full_keys):
+        self.num_keys = len(full_keys)
+        # Tree of (children, overrides, first full key) tuples mirroring the CfgNodes
+        # that hold the keys, so that each CfgNode is looked up once per `apply`
+        self._tree = ({}, [], None)
+        for i, full_key in enumerate(full_keys):
+            if cfg.key_is_deprecated(full_key):
+                continue
+            if cfg.key_is_renamed(full_key):
+                cfg.raise_key_rename_error(full_key)
+            key_list = full_key.split(".")
+            d = cfg
+            for subkey in key_list:
+                _assert_with_logging(
+                    isinstance(d, CfgNode) and subkey in d,
+                    "Non-existent key: {}".format(full_key),
+                )
+                d = d[subkey]
+            tree = self._tree
+            for subkey in key_list[:-1]:
+                if subkey not in tree[0]:
+                    tree[0][subkey] = ({}, [], full_key)
+                tree = tree[0][subkey]
+            tree[1].append((key_list[-1], i, full_key))
+
+    def apply(self, cfg, values):
+        """Set the compiled keys of `cfg` to `values` (one value per key)."""
+        _assert_with_logging(
+            len(values) == self.num_keys,
+            "Expected {} override values, got {}".format(self.num_keys, len(values)),
+        )
+        self._apply(cfg, cfg, self._tree, values)
+
+    def _apply(self, cfg, d, tree, values):
+        children, overrides, _ = tree
+        for subkey, i, full_key in overrides:
+            original = d.get(subkey, _MISSING)
+            if original is _MISSING:
+                _assert_with_logging(False, "Non-existent key: {}".format(full_key))
+            value = cfg._decode_cfg_value(values[i])
+            if type(value) is not type(original):
+                value = _check_and_coerce_cfg_value_type(
+                    value, original, subkey, full_key
+                )
+            d[subkey] = value
+        for subkey, child_tree in children.items():
+            if subkey not in d:
+                full_key = child_tree[2]
+                _assert_with_logging(False, "Non-existent key: {}".format(full_key))
+            self._apply(cfg, _get_child_for_update(d, subkey), child_tree, values)
+
+
+class _Sweep(object):
+    """Iterable of the (digest, cfg, values) triples generated by CfgNode.sweep."""
+
+    def __init__(self, cfg, space, num_samples, seed, unique):
+        space = list(space.items()) if isinstance(space, dict) else list(space)
+        for key, values in space:
+            _assert_with_logging(
+                num_samples is not None or isinstance(values, (list, tuple)),
+                "The values of {} must be a list to generate a grid".format(key),
+            )
+        self.cfg = cfg
+        # Overrides of deprecated keys are ignored
+        self.keys = [k for k, _ in space if not cfg.key_is_deprecated(k)]
+        self.space = space
+        self.plan = cfg.compile_overrides([k for k, _ in space])
+        self.num_samples = num_samples
+        self.seed = seed
+        self.unique = unique
+
+    def __iter__(self):
+        base = self.cfg.clone(copy_on_write=True)
+        base.freeze()
+        base_digest = hashlib.sha1(base.dump().encode("utf-8")).hexdigest()
+        key_lists = [k.split(".") for k in self.keys]
+        seen = set()
+        for values in self._iter_values():
+            cfg = base.clone(copy_on_write=True)
+            self.plan.apply(cfg, values)
+            cfg.freeze()
+            # The read back values are the ones after type coercion
+            values = [_get_leaf(cfg, key_list) for key_list in key_lists]
+            digest = hashlib.sha1(base_digest.encode("utf-8"))
+            for key, value in sorted(zip(self.keys, values)):
+                digest.update(repr((key, value)).encode("utf-8"))
+            digest = digest.hexdigest()
+            if self.unique:
+                if digest in seen:
+                    continue
+                seen.add(digest)
+            yield digest, cfg, values
+
+    def _iter_values(self):
+        if self.num_samples is None:
+            for values in itertools.product(*[v for _, v in self.space]):
+                yield values
+            return
+        rng = random.Random(self.seed)
+        for _ in range(self.num_samples):
+            yield [
+                rng.choice(v) if isinstance(v, (list, tuple)) else v(rng)
+                for _, v in self.space
+            ]
+
+
+def _get_leaf(cfg, key_list):
+    """Return the value at `key_list` in `cfg` without unsharing CfgNodes."""
+    value = cfg
+    for k in key_list:
+        value = dict.__getitem__(value, k)
+    return value
+
+
+def _indent_yaml(s):
+    return "".join("  " + line for line in s.splitlines(True))
+
+
+def _load_cfg_file(args):
+    """Load a CfgNode of type `cls` from a file; used by CfgNode.merge_from_files."""
+    cls, filename = args
+    try:
+        with open(filename, "r") as f:
+            return cls.load_cfg(f)
+    except Exception as e:
+        raise _exception_with_filename(e, filename)
+
+
+def _total_file_size(filenames):
+    """Return the total size of the existing files among `filenames`."""
+    size = 0
+    for filename in filenames:
+        try:
+            size += os.path.getsize(filename)
+        except OSError:
+            # Loading the file reports the error
+            pass
+    return size
+
+
+def _exception_with_filename(e, filename):
+    """Return an exception like `e` whose message is prefixed with `filename`."""
+    # The message of a KeyError is its argument, without the quotes of str(e)
+    msg = e.args[0] if len(e.args) == 1 else str(e)
+    msg = "{}: {}".format(filename, msg)
+    try:
+        return type(e)(msg)
+    except Exception:
+        return RuntimeError(msg)
+
+
+def _get_child_for_read(node, key):
+    """Return `node[key]`, leaving it borrowed if it is a CfgNode borrowed from
+    another config, for lookups that do not modify it.
+    """
+    value = dict.__getitem__(node, key)
+    if type(value) is _LazyDict:
+        value = node._materialize_child(key, value)
+    return value
+
+
+def _get_child_for_update(node, key):
+    """Return `node[key]`, which is a private copy if it is a CfgNode borrowed
+    from another config, so that it can be modified in place.
+    """
+    return node[key]
+
+
+def _decode_or_copy_value(b, value):
+    """Return a copy of `value` that can be assigned into `b`. Only strings and
+    dicts need decoding; values that are already typed are just copied.
+    """
+    if isinstance(value, (str, dict)):
+        return b._decode_cfg_value(value)
+    return _copy_leaf(value)
+
+
+def _check_and_coerce_cfg_value_type(replacement, original, key, full_key):
+    """Checks that `replacement`, which is intended to replace `original` is of
+    the right type. The type is correct if it matches exactly or is one of a few
+    cases in which the type can be easily coerced.
+    """
+    value = _coerce_cfg_value(replacement, original)
+    if value is _MISSING:
+        raise ValueError(
+            "Type mismatch ({} vs. {}) with values ({} vs. {}) for config "
+            "key: {}".format(
+                type(original), type(replacement), original, replacement, full_key
+            )
+        )
+    return value
+
+
+def _coerce_cfg_value(replacement, original):
+    """Return `replacement` coerced to the type of `original` (see
+    _check_and_coerce_cfg_value_type), or _MISSING if it cannot be.
+    """
+    original_type = type(original)
+    replacement_type = type(replacement)
+    # The types must match (with some exceptions)
+    if replacement_type is original_type:
+        return replacement
+    cast = _CFG_VALUE_CASTS.get((original_type, replacement_type), _MISSING)
+    if cast is None:
+        return replacement
+    if cast is _MISSING:
+        return _MISSING
+    return cast(replacement)
+
+
+def _build_cfg_value_casts():
+    """Map each (original type, replacement type) pair of different types that can
+    be coerced to the type to cast the replacement to, or None to keep it as is.
+    """
+    casts = {}
+    # If either of them is None, allow type conversion to one of the valid types
+    for valid_type in _VALID_TYPES:
+        casts[(valid_type, type(None))] = None
+        casts[(type(None), valid_type)] = None
+    # list <-> tuple
+    casts[(list, tuple)] = list
+    casts[(tuple, list)] = tuple
+    # For py2: allow converting from str (bytes) to a unicode string
+    if _PY2:
+        casts[(unicode, str)] = unicode  # noqa: F821
+    return casts
+
+
+_CFG_VALUE_CASTS = _build_cfg_value_casts()
+
 
 def _assert_with_logging(cond, msg):
     if not cond:
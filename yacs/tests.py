@@ -1,4 +1,8 @@
+import json
 import logging
+import os
+import pickle
+import random
 import tempfile
 import unittest
 
@@ -57,6 +61,46 @@ def get_cfg(cls=CN):
     return cfg
 
 
+def set_flags(node, is_frozen, flags):
+    """Set the frozen flags of `node` and its sub-configs by id."""
+    flags[id(node)] = is_frozen
+    for v in dict.values(node):
+        if isinstance(v, CN):
+            set_flags(v, is_frozen, flags)
+
+
+def copy_flags(a, b, nodes, flags):
+    """Copy the frozen flags of `a` and its sub-configs to its copy `b`."""
+    nodes.append(b)
+    flags[id(b)] = flags[id(a)]
+    for k, v in dict.items(a):
+        if isinstance(v, CN):
+            copy_flags(v, dict.__getitem__(b, k), nodes, flags)
+
+
+def contains(a, b):
+    return a is b or any(isinstance(v, CN) and contains(v, b) for v in dict.values(a))
+
+
+def sub_config_paths(node, path=()):
+    """Return the key paths of `node` and its sub-configs."""
+    paths = [path]
+    for k, v in dict.items(node):
+        if isinstance(v, CN):
+            paths += sub_config_paths(v, path + (k,))
+    return paths
+
+
+def get_sub_config(node, path, rnd):
+    """Return the sub-config of `node` at `path`, read with a random method."""
+    for k in path:
+        if rnd.random() < 0.5:
+            node = node[k]
+        else:
+            node = dict(rnd.choice([node.items, node.copy])())[k]
+    return node
+
+
 class TestCfgNode(unittest.TestCase):
     def test_immutability(self):
         # Top level immutable
@@ -85,6 +129,146 @@ class TestCfgNode(unittest.TestCase):
             a.level1.bar = 1
         assert a.level1.level2.foo == 0
 
+    def test_immutability_of_subtrees(self):
+        a = CN({"A": {"B": {"C": 1}}, "D": {"E": 2}})
+        a.A.freeze()
+        assert a.A.is_frozen() and a.A.B.is_frozen()
+        assert not a.is_frozen() and not a.D.is_frozen()
+        a.freeze()
+        a.defrost()
+        assert not a.A.B.is_frozen()
+        a.A.B.freeze()
+        assert a.A.B.is_frozen() and not a.A.is_frozen()
+        a.freeze()
+        assert a.is_frozen() and a.D.is_frozen()
+
+        # Sub-configs added to a config keep their mutability until the config is
+        # frozen or defrosted again
+        a.defrost()
+        a.F = CN()
+        a.G = CN()
+        a.G.freeze()
+        assert not a.F.is_frozen() and a.G.is_frozen()
+        a.freeze()
+        assert a.F.is_frozen() and a.G.is_frozen()
+        a.defrost()
+        assert not a.F.is_frozen() and not a.G.is_frozen()
+
+        # Clones have a state of their own
+        a.A.freeze()
+        b = a.A.clone()
+        assert b.is_frozen() and b.B.is_frozen()
+        b.defrost()
+        b.B.C = 2
+        assert a.A.B.is_frozen() and a.A.B.C == 1
+        a.defrost()
+        b.freeze()
+        assert not a.A.B.is_frozen() and b.B.is_frozen()
+
+    def test_immutability_of_attached_subtrees(self):
+        # Calls made before a sub-config is added to a config do not apply to it
+        b = CN({"X": 1})
+        b.freeze()
+        a = CN()
+        a.defrost()
+        a.B = b
+        assert b.is_frozen() and a.B.is_frozen()
+        with self.assertRaises(AttributeError):
+            a.B.X = 2
+        a.freeze()
+        a.defrost()
+        assert not b.is_frozen()
+
+        # A sub-config in two configs follows both
+        a2 = CN()
+        a2.B = b
+        a.freeze()
+        assert b.is_frozen() and a2.B.is_frozen() and not a2.is_frozen()
+        with self.assertRaises(AttributeError):
+            a2.B.X = 2
+        a2.defrost()
+        assert not a.B.is_frozen() and a.is_frozen()
+
+        # Removed or replaced sub-configs no longer follow the config
+        del a["B"]
+        a.defrost()
+        assert not b.is_frozen()
+        a2.freeze()
+        assert b.is_frozen()
+        a2.defrost()
+        a2.B = CN()
+        b.freeze()
+        a2.defrost()
+        assert b.is_frozen() and not a2.B.is_frozen()
+        c = a2.pop("B")
+        a2.freeze()
+        assert not c.is_frozen()
+
+        # Configs that are gone leave no links behind, but their last call applies
+        b = CN({"X": 1})
+        for _ in range(1000):
+            a = CN()
+            a.B = b
+        a.freeze()
+        del a
+        assert b.is_frozen()
+        b.defrost()
+        b.X = 2
+        assert len(b.__dict__[CN.IMMUTABLE].parents) == 0
+        assert len(pickle.dumps(b)) < 1000
+
+    def test_immutability_random_trees(self):
+        # Compare with freeze() and defrost() applied recursively to flags, as a
+        # CfgNode without linked frozen states would do
+        for seed in range(50):
+            rnd = random.Random(seed)
+            nodes = [CN() for _ in range(4)]
+            flags = {id(n): False for n in nodes}
+            for _ in range(100):
+                op = rnd.random()
+                node = rnd.choice(nodes)
+                if op < 0.1:
+                    nodes.append(CN())
+                    flags[id(nodes[-1])] = False
+                elif op < 0.15 and len(nodes) > 2:
+                    nodes.remove(node)
+                elif op < 0.45:
+                    child = rnd.choice(nodes)
+                    if not contains(child, node):
+                        node["K{}".format(rnd.randrange(4))] = child
+                elif op < 0.6 and len(node) > 0:
+                    key = rnd.choice(list(node.keys()))
+                    rnd.choice([node.pop, node.__delitem__])(key)
+                elif op < 0.65:
+                    if rnd.random() < 0.5:
+                        copy_flags(node, node.clone(), nodes, flags)
+                    else:
+                        copy_flags(node, pickle.loads(pickle.dumps(node)), nodes, flags)
+                elif op < 0.8:
+                    node.freeze()
+                    set_flags(node, True, flags)
+                else:
+                    node.defrost()
+                    set_flags(node, False, flags)
+                for node in nodes:
+                    assert node.is_frozen() == flags[id(node)]
+
+    def test_create_from_dict(self):
+        scales = [1, 2]
+        names = ("a", ("b", "c"))
+        init_dict = {"A": {"B": {"SCALES": scales, "NAMES": names}}, "C": 1}
+        a = CN(init_dict)
+        assert type(a.A) is CN and type(a.A.B) is CN
+        assert a.A.B.SCALES == scales
+        assert a.C == 1
+        # Mutable leaves are copied, immutable leaves are shared
+        assert a.A.B.SCALES is not scales
+        assert a.A.B.NAMES is names
+        # The input dict is left untouched
+        assert type(init_dict["A"]) is dict
+        with self.assertRaises(AssertionError):
+            CN({"A": {"B": {"C": object()}}})
+
 
 class TestCfg(unittest.TestCase):
     def test_copy_cfg(self):
@@ -94,6 +278,112 @@ class TestCfg(unittest.TestCase):
         cfg2.MODEL.TYPE = "dummy"
         assert cfg.MODEL.TYPE == s
 
+    def test_copy_cfg_copy_on_write(self):
+        cfg = get_cfg()
+        cfg.freeze()
+        cfg2 = cfg.clone(copy_on_write=True)
+        assert cfg2 == cfg
+        assert cfg2.is_frozen()
+        # Sub-configs are borrowed, and copied when accessed through the clone
+        assert dict.__getitem__(cfg2, "MODEL") is cfg.MODEL
+        assert cfg2.MODEL is not cfg.MODEL
+        assert dict.__getitem__(cfg2, "MODEL") is cfg2.MODEL
+        with self.assertRaises(AttributeError):
+            cfg2.MODEL.TYPE = "dummy"
+        assert cfg.MODEL == CN({"TYPE": "a_foo_model"})
+        # Merging copies only the modified path
+        cfg2.merge_from_list(["MODEL.TYPE", "dummy", "STR.FOO.KEY1", 3])
+        assert cfg2.MODEL.TYPE == "dummy"
+        assert cfg.MODEL.TYPE == "a_foo_model"
+        assert cfg2.STR.FOO.KEY1 == 3
+        assert cfg.STR.FOO.KEY1 == 1
+        assert dict.__getitem__(cfg2.STR.FOO, "BAR") is cfg.STR.FOO.BAR
+        assert dict.__getitem__(cfg2, "TRAIN") is cfg.TRAIN
+        assert cfg2.is_frozen() and cfg2.STR.FOO.is_frozen()
+        # Defrosting either config never affects the other one
+        cfg2.defrost()
+        cfg2.TRAIN.HYPERPARAMETER_1 = 0.5
+        cfg2.STR.FOO.BAR.KEY2 = 5
+        assert cfg.TRAIN.HYPERPARAMETER_1 == 0.1
+        assert cfg.STR.FOO.BAR.KEY2 == 2
+        cfg.defrost()
+        cfg.KWARGS.Y.X = 10
+        assert cfg2.KWARGS.Y.X == 1
+        assert cfg.clone() == cfg
+        # Mutable leaves are copied too
+        cfg.KWARGS.Y.L = [1]
+        cfg.freeze()
+        cfg3 = cfg.clone(copy_on_write=True)
+        cfg3.freeze()
+        cfg3.KWARGS.Y.L.append(2)
+        assert cfg.KWARGS.Y.L == [1]
+        # Sub-configs of the source stay its own, and are copied for the clones
+        # before they change
+        cfg.MODEL.defrost()
+        model = cfg.MODEL
+        cfg3 = cfg.clone(copy_on_write=True)
+        model.TYPE = "dummy"
+        assert cfg.MODEL is model and model.TYPE == "dummy"
+        assert cfg3.MODEL.TYPE == "a_foo_model"
+        cfg.defrost()
+        cfg3 = cfg.clone(copy_on_write=True)
+        cfg.KWARGS.Y.L.append(3)
+        assert cfg3.KWARGS.Y.L == [1]
+        cfg.KWARGS.Y.X = 20
+        cfg.KWARGS.pop("Y")
+        assert cfg3.KWARGS.Y.X == 10
+        # Sub-configs handed out by a mutable clone can be modified
+        cfg3 = cfg.clone(copy_on_write=True)
+        cfg3.defrost()
+        for modify in [
+            lambda node: node.update({"NEW": 1}),
+            lambda node: node.setdefault("NEW", 2),
+            lambda node: node.pop("NEW"),
+            lambda node: node.clear(),
+        ]:
+            for v in cfg3.values():
+                if isinstance(v, CN):
+                    modify(v)
+        for _, v in cfg3.items():
+            assert v == {} or not isinstance(v, CN)
+        assert cfg.TRAIN.HYPERPARAMETER_1 == 0.1 and cfg.STR.FOO.KEY1 == 1
+        assert cfg.MODEL.TYPE == "dummy"
+
+    def test_copy_on_write_random_trees(self):
+        # Compare with configs cloned by deepcopy, modifying sub-configs read before
+        # or after cloning
+        for seed in range(30):
+            rnd = random.Random(seed)
+            cfgs = [CN({"A": {"B": {"X": 0, "L": [0]}, "Y": 0}, "C": {"X": 0}})]
+            refs = [cfgs[0].clone()]
+            for _ in range(40):
+                i = rnd.randrange(len(cfgs))
+                path = rnd.choice(sub_config_paths(refs[i]))
+                node = get_sub_config(cfgs[i], path, rnd)
+                ref = get_sub_config(refs[i], path, rnd)
+                for _ in range(rnd.randrange(3)):
+                    j = rnd.randrange(len(cfgs))
+                    cfgs[j].freeze()
+                    cfgs.append(cfgs[j].clone(copy_on_write=True))
+                    refs.append(refs[j].clone())
+                    cfgs[j].defrost()
+                    cfgs[-1].defrost()
+                key = rnd.choice(["X", "Y", "L", "N"])
+                op = rnd.random()
+                if op < 0.4:
+                    node[key] = ref[key] = rnd.randrange(10)
+                elif op < 0.6:
+                    node[key] = CN({"X": 0, "L": [0]})
+                    ref[key] = CN({"X": 0, "L": [0]})
+                elif op < 0.8 and key in ref:
+                    node.pop(key)
+                    ref.pop(key)
+                elif isinstance(ref.get(key), list):
+                    node[key].append(1)
+                    ref[key].append(1)
+                for cfg, ref in zip(cfgs, refs):
+                    assert cfg == ref
+
     def test_merge_cfg_from_cfg(self):
         # Test: merge from clone
         cfg = get_cfg()
@@ -150,6 +440,26 @@ class TestCfg(unittest.TestCase):
         with self.assertRaises(ValueError):
             cfg.merge_from_other_cfg(cfg2)
 
+    def test_merge_cfg_from_cfg_copies_values(self):
+        cfg = get_cfg()
+        cfg.KWARGS.LIST = [1, 2]
+        cfg2 = CN()
+        cfg2.KWARGS = CN()
+        cfg2.KWARGS.LIST = [3]
+        cfg2.KWARGS.NEW = CN()
+        cfg2.KWARGS.NEW.LIST = [4]
+        cfg2.TRAIN = CN()
+        cfg2.TRAIN.SCALES = "(1, 2)"
+        cfg.merge_from_other_cfg(cfg2)
+        # Merged values never alias values of the other config
+        assert cfg.KWARGS.LIST == [3]
+        assert cfg.KWARGS.LIST is not cfg2.KWARGS.LIST
+        assert cfg.KWARGS.NEW is not cfg2.KWARGS.NEW
+        assert cfg.KWARGS.NEW.LIST is not cfg2.KWARGS.NEW.LIST
+        # Strings are still decoded as literals
+        assert cfg.TRAIN.SCALES == (1, 2)
+        assert cfg2.TRAIN.SCALES == "(1, 2)"
+
     def test_merge_cfg_from_file(self):
         with tempfile.NamedTemporaryFile(mode="wt") as f:
             cfg = get_cfg()
@@ -175,6 +485,89 @@ class TestCfg(unittest.TestCase):
         assert cfg.MODEL.TYPE == "foobar"
         assert cfg.NUM_GPUS == 2
 
+    def test_value_type_coercion(self):
+        cfg = get_cfg()
+        cfg.NONE = None
+        cfg.merge_from_other_cfg(
+            CN({"TRAIN": {"SCALES": [1, 2]}, "NONE": [3], "MODEL": {"TYPE": None}})
+        )
+        assert cfg.TRAIN.SCALES == (1, 2) and cfg.NONE == [3] and cfg.MODEL.TYPE is None
+        with self.assertRaises(ValueError) as cm:
+            cfg.merge_from_other_cfg(CN({"STR": {"FOO": {"KEY1": 0.5}}}))
+        assert str(cm.exception) == (
+            "Type mismatch ({} vs. {}) with values (1 vs. 0.5) for config key: "
+            "STR.FOO.KEY1".format(int, float)
+        )
+
+    def test_key_index(self):
+        cfg = get_cfg()
+        cfg.set_key_index_enabled(True)
+        assert cfg.is_key_index_enabled()
+        assert cfg.get_by_path("STR.FOO.BAR.KEY1") == 1
+        cfg.set_by_path("STR.FOO.BAR.KEY1", 5)
+        assert cfg.STR.FOO.BAR.KEY1 == 5
+        cfg.merge_from_list(["MODEL.TYPE", "foobar", "TRAIN.SCALES", "(1, )"])
+        assert cfg.MODEL.TYPE == "foobar"
+        assert cfg.TRAIN.SCALES == (1,)
+        with self.assertRaises(AssertionError):
+            cfg.merge_from_list(["MODEL.DOES_NOT_EXIST", "IGNORE"])
+        # The index follows structural changes
+        cfg.STR.FOO = CN()
+        cfg.STR.FOO.NEW = 1
+        assert cfg.get_by_path("STR.FOO.NEW") == 1
+        with self.assertRaises(AssertionError):
+            cfg.get_by_path("STR.FOO.BAR.KEY1")
+        cfg.STR.pop("FOO")
+        with self.assertRaises(AssertionError):
+            cfg.set_by_path("STR.FOO.NEW", 2)
+        cfg.freeze()
+        with self.assertRaises(AttributeError):
+            cfg.set_by_path("MODEL.TYPE", "dummy")
+        # Copies have their own index
+        cfg2 = cfg.clone(copy_on_write=True)
+        cfg2.defrost()
+        cfg2.set_by_path("MODEL.TYPE", "dummy")
+        assert cfg2.MODEL.TYPE == "dummy"
+        assert cfg.MODEL.TYPE == "foobar"
+        # Lookups of immutable values do not copy borrowed sub-configs
+        assert cfg2.get_by_path("KWARGS.Y.X") == 1
+        cfg2.fingerprint(keys=["TRAIN.SCALES", "STR"])
+        assert dict.__getitem__(cfg2, "KWARGS") is cfg.KWARGS
+        assert dict.__getitem__(cfg2, "TRAIN") is cfg.TRAIN
+        assert dict.__getitem__(cfg2, "STR") is cfg.STR
+        # Sub-configs are handed out as private copies
+        assert cfg2.get_by_path("KWARGS.Y") is cfg2.KWARGS.Y
+        assert cfg2.KWARGS.Y is not cfg.KWARGS.Y
+        # The index is only rebuilt after structural changes to its own tree
+        entries = cfg2.__dict__[CN.KEY_INDEX].get_entries(cfg2)
+        cfg3 = get_cfg()
+        cfg3.NEW = 1
+        assert cfg2.__dict__[CN.KEY_INDEX].get_entries(cfg2) is entries
+        cfg2.MODEL.NEW = 1
+        assert cfg2.__dict__[CN.KEY_INDEX].get_entries(cfg2) is not entries
+        assert cfg2.get_by_path("MODEL.NEW") == 1
+
+    def test_decode_cfg_value_cache(self):
+        CN.clear_decode_cache()
+        values = ["foo/bar", "a_name", "0.5", "(1, 2)", "[1, [2]]", "True", "'x'"]
+        expected = ["foo/bar", "a_name", 0.5, (1, 2), [1, [2]], True, "x"]
+        for _ in range(2):
+            assert [CN._decode_cfg_value(v) for v in values] == expected
+        info = CN.decode_cache_info()
+        assert info["misses"] == 5 and info["hits"] == 5 and info["size"] == 5
+        # Mutable values are never shared between calls
+        a = CN._decode_cfg_value("[1, [2]]")
+        a[1].append(3)
+        assert CN._decode_cfg_value("[1, [2]]") == [1, [2]]
+        # Nor are tuples, which would be dumped as YAML aliases
+        cfg = get_cfg()
+        cfg.TEST = CN({"SCALES": (1,)})
+        cfg.merge_from_list(["TRAIN.SCALES", "(8, 10)", "TEST.SCALES", "(8, 10)"])
+        assert cfg.TRAIN.SCALES is not cfg.TEST.SCALES
+        assert "&id" not in cfg.dump()
+        CN.clear_decode_cache()
+        assert CN.decode_cache_info()["size"] == 0
+
     def test_deprecated_key_from_list(self):
         # You should see logger messages like:
         #   "Deprecated config key (ignoring): MODEL.DILATION"
@@ -230,6 +623,13 @@ class TestCfg(unittest.TestCase):
             _ = cfg.EXAMPLE.OLD.KEY  # noqa
         with self.assertRaises(KeyError):
             cfg.merge_from_list(opts)
+        # Sub-configs share an empty registry that cannot be modified in place
+        renamed_keys = cfg.MODEL.__dict__[CN.RENAMED_KEYS]
+        with self.assertRaises(TypeError):
+            renamed_keys["MODEL.OLD"] = "MODEL.NEW"
+        cfg.MODEL.register_renamed_key("OLD", "NEW")
+        assert cfg.MODEL.key_is_renamed("OLD")
+        assert not cfg.TRAIN.key_is_renamed("OLD") and not renamed_keys
 
     def test_renamed_key_from_file(self):
         cfg = get_cfg()
@@ -253,6 +653,472 @@ class TestCfg(unittest.TestCase):
             with open(f.name, "rt") as f_read:
                 yacs.config.load_cfg(f_read)
 
+    def test_snapshot(self):
+        cfg = get_cfg()
+        cfg.TRAIN.LIST = [1, (2, 3)]
+        with tempfile.NamedTemporaryFile(suffix=".snap") as f:
+            cfg.save_snapshot(f.name)
+            cfg2 = CN.load_snapshot(f.name)
+            assert cfg2 == cfg
+            assert type(cfg2.TRAIN.SCALES) is tuple
+            assert type(cfg2.TRAIN.LIST) is list and type(cfg2.TRAIN.LIST[1]) is tuple
+            assert cfg2.KWARGS.is_new_allowed() and not cfg2.is_new_allowed()
+            assert cfg2.key_is_deprecated("MODEL.DILATION")
+            assert cfg2.key_is_renamed("EXAMPLE.OLD.KEY")
+            # Corrupted snapshots are detected
+            with open(f.name, "rb") as f_read:
+                data = bytearray(f_read.read())
+            data[-1] ^= 0xFF
+            with open(f.name, "wb") as f_write:
+                f_write.write(data)
+            with self.assertRaises(AssertionError):
+                CN.load_snapshot(f.name)
+
+    def test_yaml_backends(self):
+        cfg = get_cfg()
+        cfg.TRAIN.NAME = "tab\tand non-ascii \u00e9"
+        cfg.KWARGS.Y.Z = ["x" * 200, "line\nbreak"]
+        dumps, loads = [], []
+        for backend in ("python", "auto"):
+            yacs.config.set_yaml_backend(backend)
+            try:
+                for c in (get_cfg(), cfg):
+                    dumps.append(c.dump())
+                    dumps.append(c.dump(default_flow_style=True, width=40))
+                    loads.append(CN.load_cfg(c.dump()))
+            finally:
+                yacs.config.set_yaml_backend("auto")
+        n = len(dumps) // 2
+        assert dumps[:n] == dumps[n:]
+        assert loads[:2] == loads[2:]
+        assert loads[1].TRAIN.NAME == cfg.TRAIN.NAME
+        with self.assertRaises(AssertionError):
+            yacs.config.set_yaml_backend("unknown")
+
+    def test_cfg_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        yacs.config.set_cfg_cache(cache_dir)
+        try:
+            with tempfile.NamedTemporaryFile("w", suffix=".yaml") as f:
+                f.write("MODEL:\n  TYPE: a\n")
+                f.flush()
+                for _ in range(2):
+                    cfg = get_cfg()
+                    cfg.merge_from_file(f.name)
+                    assert cfg.MODEL.TYPE == "a"
+                assert len(os.listdir(cache_dir)) == 1
+                # Changed files are parsed again
+                f.write("TRAIN:\n  HYPERPARAMETER_1: 0.5\n")
+                f.flush()
+                cfg.merge_from_file(f.name)
+                assert cfg.TRAIN.HYPERPARAMETER_1 == 0.5
+                assert len(os.listdir(cache_dir)) == 2
+            for _ in range(2):
+                cfg = get_cfg()
+                cfg.merge_from_file("example/config_override.py")
+                assert cfg.TRAIN.HYPERPARAMETER_1 == 0.9
+            # The least recently used entries are evicted
+            yacs.config.set_cfg_cache(cache_dir, max_size_mb=0)
+            cfg.merge_from_file("example/config_override_from_dict.py")
+            assert len(os.listdir(cache_dir)) == 0
+        finally:
+            yacs.config.set_cfg_cache(None)
+
+    def test_compile_overrides(self):
+        cfg = get_cfg()
+        keys = ["MODEL.TYPE", "TRAIN.SCALES", "MODEL.DILATION", "NUM_GPUS"]
+        plan = cfg.compile_overrides(keys)
+        for copy_on_write in (False, True):
+            cfg2 = cfg.clone(copy_on_write=copy_on_write)
+            plan.apply(cfg2, ["a", "[1, 2]", 2, "4"])
+            cfg3 = cfg.clone()
+            cfg3.merge_from_list(["MODEL.TYPE", "a", "TRAIN.SCALES", "[1, 2]"])
+            cfg3.merge_from_list(["MODEL.DILATION", 2, "NUM_GPUS", "4"])
+            assert cfg2 == cfg3
+            assert cfg == get_cfg()
+        with self.assertRaises(ValueError):
+            plan.apply(cfg.clone(), ["a", "[1, 2]", 2, "b"])
+        with self.assertRaises(AssertionError):
+            plan.apply(cfg.clone(), ["a"])
+        with self.assertRaises(AssertionError):
+            cfg.compile_overrides(["MODEL.DOES_NOT_EXIST"])
+        with self.assertRaises(KeyError):
+            cfg.compile_overrides(["EXAMPLE.OLD.KEY"])
+
+    def test_sweep(self):
+        cfg = get_cfg()
+        space = {"MODEL.TYPE": ["a", "b"], "TRAIN.SCALES": [[1], [1, 2], [1]]}
+        points = list(cfg.sweep(space))
+        assert len(points) == 4
+        assert len(list(cfg.sweep(space, unique=False))) == 6
+        assert [d for d, _ in points] == [d for d, _ in cfg.sweep(space)]
+        digest, cfg2 = points[-1]
+        assert cfg2.MODEL.TYPE == "b" and cfg2.TRAIN.SCALES == (1, 2)
+        assert cfg2.is_frozen() and cfg2.STR == cfg.STR
+        assert cfg == get_cfg()
+        # Random search
+        space = {"TRAIN.HYPERPARAMETER_1": lambda rng: rng.uniform(0, 1)}
+        points = list(cfg.sweep(space, num_samples=5, seed=0))
+        assert len(points) == 5
+        assert points == list(cfg.sweep(space, num_samples=5, seed=0))
+        with tempfile.NamedTemporaryFile(suffix=".yaml") as f:
+            assert cfg.save_sweep(f.name, space, num_samples=5, seed=0) == 5
+            loaded = sorted(CN.load_sweep(f.name))
+        assert [d for d, _ in loaded] == sorted(d for d, _ in points)
+        for (_, cfg2), (_, cfg3) in zip(loaded, sorted(points)):
+            assert cfg2.TRAIN.HYPERPARAMETER_1 == cfg3.TRAIN.HYPERPARAMETER_1
+
+    def test_merge_from_files(self):
+        tmp_dir = tempfile.mkdtemp()
+        filenames = []
+        for i in range(6):
+            filenames.append(os.path.join(tmp_dir, "dataset_{}.yaml".format(i)))
+            with open(filenames[-1], "w") as f:
+                f.write("KWARGS:\n  DATASET_{}:\n    ID: {}\n".format(i, i))
+                f.write("TRAIN:\n  HYPERPARAMETER_1: {}\n".format(i * 0.1))
+        cfg = get_cfg()
+        for filename in filenames:
+            cfg.merge_from_file(filename)
+        min_pool_bytes = yacs.config._MIN_POOL_BYTES
+        try:
+            # Small files are loaded one after the other unless the minimum is 0
+            for min_bytes in (min_pool_bytes, 0):
+                yacs.config._MIN_POOL_BYTES = min_bytes
+                for use_processes in (False, True):
+                    cfg2 = get_cfg()
+                    cfg2.merge_from_files(
+                        filenames, workers=3, use_processes=use_processes
+                    )
+                    assert cfg2 == cfg
+        finally:
+            yacs.config._MIN_POOL_BYTES = min_pool_bytes
+        cfg2 = get_cfg()
+        cfg2.merge_from_files(filenames)
+        assert cfg2 == cfg
+        # Errors name the file
+        with open(filenames[2], "w") as f:
+            f.write("MODEL:\n  DOES_NOT_EXIST: 0\n")
+        with self.assertRaises(KeyError) as cm:
+            get_cfg().merge_from_files(filenames, workers=3)
+        assert filenames[2] in str(cm.exception)
+        assert "MODEL.DOES_NOT_EXIST" in str(cm.exception)
+
+    def test_cfg_stack(self):
+        filename = os.path.join(tempfile.mkdtemp(), "base.yaml")
+        with open(filename, "w") as f:
+            f.write("MODEL:\n  TYPE: base_model\nSTR:\n  KEY1: 3\n")
+        stack = yacs.config.CfgStack(get_cfg())
+        stack.push("base", filename)
+        experiment = {"STR": {"FOO": {"KEY1": 4}}, "KWARGS": {"NEW": 0}}
+        stack.push("experiment", experiment)
+        stack.push("cli", ["STR.KEY1", "5", "TRAIN.SCALES", "[1, 2]"])
+        cfg = get_cfg()
+        cfg.merge_from_file(filename)
+        cfg.merge_from_other_cfg(CN(experiment))
+        cfg.merge_from_list(["STR.KEY1", "5", "TRAIN.SCALES", "[1, 2]"])
+        assert stack.get() == cfg and stack.get().is_frozen()
+        assert stack.layer_names() == ["defaults", "base", "experiment", "cli"]
+        assert stack.source("MODEL.TYPE") == "base"
+        assert stack.source("STR.KEY1") == "cli" and stack.source("STR") == "cli"
+        assert stack.source("KWARGS.NEW") == "experiment"
+        assert stack.source("STR.FOO.KEY2") == "defaults"
+        with self.assertRaises(AssertionError):
+            stack.source("STR.DOES_NOT_EXIST")
+        # Only the layers above a replaced layer are merged again
+        merged = list(stack._merged)
+        stack.set_layer("experiment", {"STR": {"FOO": {"KEY1": 6}}})
+        assert stack._merged[:2] == merged[:2] and stack._merged[1] is merged[1]
+        assert stack.get().STR.FOO.KEY1 == 6 and "NEW" not in stack.get().KWARGS
+        model = dict.__getitem__(merged[1], "MODEL")
+        assert dict.__getitem__(stack.get(), "MODEL") is model
+        # Errors name the layer and leave the stack unchanged
+        with self.assertRaises(KeyError) as cm:
+            stack.set_layer("cli", ["MODEL.DOES_NOT_EXIST", 0])
+        assert "cli" in str(cm.exception) and stack.get().STR.KEY1 == 5
+        # Looking up sources does not copy the shared sub-configs of merged configs
+        stack.source("MODEL.TYPE")
+        stack.source("MODEL")
+        assert dict.__getitem__(stack._merged[-1], "MODEL") is model
+        # Defaults can be given as a dict
+        stack = yacs.config.CfgStack({"A": {"B": 1}})
+        stack.push("cli", ["A.B", "2"])
+        assert type(stack.get()) is CN and stack.get().A.B == 2
+        assert stack.source("A.B") == "cli"
+
+    def test_cfg_watcher(self):
+        tmp_dir = tempfile.mkdtemp()
+        filenames = [os.path.join(tmp_dir, "{}.yaml".format(i)) for i in range(3)]
+        for i, filename in enumerate(filenames):
+            with open(filename, "w") as f:
+                f.write("STR:\n  KEY{}: {}\n".format(max(i, 1), i + 10))
+        changes = []
+        watcher = yacs.config.CfgWatcher(
+            get_cfg(), filenames, callback=lambda *a: changes.append(a), debounce=0
+        )
+        cfg = watcher.get()
+        assert cfg.is_frozen() and cfg.STR.KEY1 == 11 and cfg.STR.KEY2 == 12
+        assert not watcher.check()
+        with open(filenames[1], "w") as f:
+            f.write("STR:\n  KEY1: 20\n  FOO:\n    KEY1: 21\n")
+        assert watcher.check()
+        cfg2 = watcher.get()
+        assert cfg2.STR.KEY1 == 20 and cfg2.STR.FOO.KEY1 == 21 and cfg.STR.KEY1 == 11
+        assert changes == [(cfg2, ["STR.FOO.KEY1", "STR.KEY1"])]
+        # The previous config is kept when a file cannot be merged
+        with open(filenames[0], "w") as f:
+            f.write("STR:\n  DOES_NOT_EXIST: 0\n")
+        assert not watcher.check() and watcher.get() is cfg2
+        # Changes are only applied once files stop changing
+        watcher.debounce = 60
+        with open(filenames[0], "w") as f:
+            f.write("STR:\n  KEY2: 3\n")
+        assert not watcher.check() and watcher.get() is cfg2
+        watcher.debounce = 0
+        assert watcher.check() and watcher.get().STR.KEY2 == 12
+        assert watcher.get().STR.KEY1 == 20 and changes[1][1] == []
+        watcher.start()
+        watcher.stop()
+
+    def test_profiling(self):
+        cfg_str = get_cfg().dump()
+        yacs.config.reset_profile()
+        yacs.config.enable_profiling()
+        try:
+            assert yacs.config.is_profiling_enabled()
+            cfg = CN.load_cfg(cfg_str)
+            cfg.merge_from_list(["MODEL.TYPE", "b_foo_model"])
+            yacs.config.reset_profile()
+            cfg.clone().dump()
+            assert cfg.TRAIN.SCALES == [2, 4, 8, 16] and cfg.TRAIN.SCALES
+            assert cfg["STR"]["FOO"].get("KEY1") == 1
+            with self.assertRaises(AttributeError):
+                cfg.DOES_NOT_EXIST
+        finally:
+            yacs.config.disable_profiling()
+        assert not yacs.config.is_profiling_enabled()
+        assert CN.__getattr__ is CN.__dict__["__getattr__"]
+        cfg.NUM_GPUS
+        profile = yacs.config.get_profile(cfg)
+        timings = profile["timings"]
+        assert sorted(timings) == ["clone", "dump", "yaml_emit"]
+        assert timings["dump"]["calls"] == 1 and timings["dump"]["seconds"] >= 0
+        assert profile["key_reads"] == {
+            "TRAIN": 2,
+            "TRAIN.SCALES": 2,
+            "STR": 1,
+            "STR.FOO": 1,
+            "STR.FOO.KEY1": 1,
+        }
+        assert "NUM_GPUS" in profile["unread_keys"]
+        assert "STR.FOO.KEY2" in profile["unread_keys"]
+        assert "TRAIN.SCALES" not in profile["unread_keys"]
+        assert json.loads(json.dumps(profile)) == profile
+        yacs.config.reset_profile()
+        assert yacs.config.get_profile() == {"timings": {}}
+
+    def test_load_cfg_lazy(self):
+        cfg = get_cfg()
+        cfg.TRAIN.LIST = [1, [2, 3]]
+        yaml_str = cfg.dump()
+        cfg = CN.load_cfg(yaml_str)
+        cfg2 = CN.load_cfg(yaml_str, lazy=True)
+        assert cfg2 == cfg and cfg == cfg2
+        assert cfg2.dump() == yaml_str and repr(cfg2) == repr(cfg)
+        cfg2.freeze()
+        assert cfg2.STR.FOO.BAR.is_frozen()
+        with self.assertRaises(AttributeError):
+            cfg2.STR.FOO.BAR.KEY1 = 0
+        cfg2.defrost()
+        cfg3 = CN.load_cfg(yaml_str, lazy=True)
+        cfg3.merge_from_other_cfg(CN.load_cfg("STR:\n  FOO:\n    KEY1: 3\n", lazy=True))
+        assert cfg3.STR.FOO.KEY1 == 3 and cfg3.STR.FOO.BAR.KEY1 == 1
+        assert cfg3.clone(copy_on_write=True) == cfg3.clone() == cfg3
+
+    def test_dump_to(self):
+        cfg = get_cfg()
+        cfg.TRAIN.LIST = [1, [2, 3]]
+        cfg.STR.FOO.LIST = cfg.TRAIN.LIST
+        for kwargs in ({}, {"default_flow_style": True}, {"indent": 4}):
+            with tempfile.TemporaryFile("w+") as f:
+                cfg.dump_to(f, **kwargs)
+                f.seek(0)
+                assert f.read() == cfg.dump(**kwargs)
+        dict.__setitem__(cfg.STR.FOO, "INVALID_KEY_TYPE", {1})
+        with self.assertRaises(AssertionError):
+            with tempfile.TemporaryFile("w+") as f:
+                cfg.dump_to(f)
+
+    def test_compact_cfg_node(self):
+        cfg = get_cfg(yacs.config.CompactCfgNode)
+        assert isinstance(cfg, dict) and isinstance(cfg.TRAIN, CN)
+        assert type(cfg.TRAIN) is yacs.config.CompactCfgNode
+        assert cfg.key_is_deprecated("MODEL.DILATION")
+        # No instance dict is created
+        assert not vars(CN)["__dict__"].__get__(cfg.TRAIN)
+        cfg.merge_from_list(["TRAIN.HYPERPARAMETER_1", 0.5])
+        cfg.freeze()
+        with self.assertRaises(AttributeError):
+            cfg.TRAIN.HYPERPARAMETER_1 = 0.2
+        cfg2 = pickle.loads(pickle.dumps(cfg))
+        for c in (cfg2, cfg.clone(), cfg.clone(copy_on_write=True)):
+            assert c == cfg and type(c.TRAIN) is yacs.config.CompactCfgNode
+            assert c.is_frozen() and c.key_is_renamed("EXAMPLE.OLD.KEY")
+
+    def test_shared_cfg(self):
+        cfg = get_cfg()
+        cfg.MISC = CN({"BIG": 2 ** 70, "NEG": -3, "NONE": None, "LIST": [1, "a"]})
+        with self.assertRaises(AssertionError):
+            cfg.publish_shared("unused")
+        cfg.freeze()
+        name = os.path.join(tempfile.mkdtemp(), "cfg")
+        cfg.publish_shared(name)
+        try:
+            view = CN.attach_shared(name)
+            assert view == cfg and cfg == view and view.is_frozen()
+            assert view.TRAIN.SCALES == (2, 4, 8, 16) and view.MISC.BIG == 2 ** 70
+            assert list(view) == list(cfg) and list(view.STR.FOO) == list(cfg.STR.FOO)
+            assert "MODEL" in view and "FOO" not in view and view.get("FOO") is None
+            with self.assertRaises(AttributeError):
+                view.FOO
+            with self.assertRaises(AttributeError):
+                view.TRAIN.HYPERPARAMETER_1 = 0.2
+            assert view.dump() == cfg.dump()
+            assert isinstance(view.clone(), CN) and view.clone() == cfg
+            assert pickle.loads(pickle.dumps(view.TRAIN)) == cfg.TRAIN
+        finally:
+            yacs.config.unlink_shared(name)
+
+    def test_view(self):
+        cfg = get_cfg()
+        with self.assertRaises(AssertionError):
+            cfg.view()
+        cfg.freeze()
+        view = cfg.view()
+        assert view.TRAIN.HYPERPARAMETER_1 == 0.1
+        assert view["MODEL"].TYPE == "a_foo_model"
+        assert list(view) == list(cfg) and len(view.STR) == len(cfg.STR)
+        assert "NUM_GPUS" in view and "FOO" not in view
+        with self.assertRaises(AttributeError):
+            view.FOO
+        with self.assertRaises(AttributeError):
+            view.TRAIN.HYPERPARAMETER_1 = 0.2
+
+    def test_frozen_struct(self):
+        cfg = get_cfg()
+        cfg.freeze()
+        struct = cfg.to_frozen_struct()
+        assert struct.TRAIN.HYPERPARAMETER_1 == 0.1
+        assert struct.MODEL.TYPE == "a_foo_model"
+        assert struct.TRAIN.SCALES == (2, 4, 8, 16) and struct._fields == tuple(cfg)
+        with self.assertRaises(AttributeError):
+            struct.TRAIN.HYPERPARAMETER_1 = 0.2
+        # Record types are shared by configs with the same keys
+        cfg2 = get_cfg()
+        cfg2.TRAIN.HYPERPARAMETER_1 = 0.2
+        cfg2.freeze()
+        assert type(cfg2.to_frozen_struct().TRAIN) is type(struct.TRAIN)
+        cfg3 = CN.from_frozen_struct(struct)
+        assert cfg3 == cfg and cfg3.is_frozen() and list(cfg3) == list(cfg)
+        cfg4 = CN({"_PRIVATE": 1})
+        cfg4.freeze()
+        with self.assertRaises(AssertionError):
+            cfg4.to_frozen_struct()
+
+    def test_fingerprint(self):
+        cfg = get_cfg()
+        fingerprint = cfg.fingerprint()
+        cfg2 = CN(dict(reversed(list(get_cfg().items()))))
+        assert list(cfg2) != list(cfg) and cfg2.fingerprint() == fingerprint
+        cfg2.TRAIN.SCALES = [2, 4, 8, 16]
+        assert cfg2.fingerprint() != fingerprint
+        # Memoized fingerprints are updated when the config changes
+        cfg.freeze()
+        assert cfg.fingerprint() == fingerprint == cfg.fingerprint()
+        cfg.defrost()
+        cfg.STR.FOO.BAR.KEY1 = 3
+        cfg.freeze()
+        assert cfg.fingerprint() != fingerprint
+        # Including changes made in place while a clone or sub-config is defrosted
+        a = CN({"T": {"L": [1, 2]}})
+        a.freeze()
+        a.fingerprint()
+        b = a.clone()
+        b.defrost()
+        b.T.L.append(3)
+        b.freeze()
+        assert b.fingerprint() != a.fingerprint()
+        a.T.defrost()
+        a.T.L.append(3)
+        a.T.freeze()
+        assert b.fingerprint() == a.fingerprint()
+        # And to the lists of frozen configs
+        a.T.L.append(4)
+        assert b.fingerprint() != a.fingerprint()
+        b.T.L.append(4)
+        assert b.fingerprint() == a.fingerprint()
+        assert pickle.loads(pickle.dumps(cfg)).fingerprint() == cfg.fingerprint()
+        assert get_cfg(yacs.config.CompactCfgNode).fingerprint() == fingerprint
+        # Only the given keys are hashed
+        keys = ["MODEL", "TRAIN.HYPERPARAMETER_1"]
+        assert cfg.fingerprint(keys) == get_cfg().fingerprint(keys)
+        cfg2 = get_cfg()
+        cfg2.MODEL.TYPE = "a_bar_model"
+        assert cfg2.fingerprint(keys) != cfg.fingerprint(keys)
+
+    def test_diff(self):
+        cfg = get_cfg()
+        assert not cfg.diff(get_cfg())
+        cfg2 = get_cfg()
+        cfg2.MODEL.TYPE = "1e-3"
+        cfg2.TRAIN.SCALES = [2, 4, 8, 16]
+        cfg2.STR.FOO.BAR.KEY1 = 3
+        del cfg2.STR.FOO["KEY2"]
+        cfg2.KWARGS.Y.Z = 2
+        cfg2.NEW = CN({"A": 1, "B": CN({"C": 2})})
+        diff = cfg.diff(cfg2)
+        assert diff.added == {"KWARGS.Y.Z": 2, "NEW.A": 1, "NEW.B.C": 2}
+        assert diff.removed == {"STR.FOO.KEY2": 2}
+        assert diff.changed == {
+            "MODEL.TYPE": ("a_foo_model", "1e-3"),
+            "TRAIN.SCALES": ((2, 4, 8, 16), [2, 4, 8, 16]),
+            "STR.FOO.BAR.KEY1": (1, 3),
+        }
+        assert diff.type_changed == ["TRAIN.SCALES"] and len(diff) == 7
+        assert "~ STR.FOO.BAR.KEY1: 1 -> 3" in str(diff).split("\n")
+        cfg.merge_from_list(diff.to_override_list())
+        assert cfg.MODEL.TYPE == "1e-3" and cfg.STR.FOO.BAR.KEY1 == 3
+        assert list(cfg.diff(cfg2).changed) == ["TRAIN.SCALES"]
+        # Changes of type that merge_from_list cannot make are left out
+        a = CN({"X": 1, "C": {"D": 1}, "L": (1,), "N": None, "S": "a"})
+        b = CN({"X": 1.0, "C": 5, "L": [1], "N": 2, "S": "b"})
+        assert a.diff(b).to_override_list() == ["N", 2, "S", "b"]
+        a.merge_from_list(a.diff(b).to_override_list())
+        assert sorted(a.diff(b).changed) == ["C", "L", "X"]
+        # Sub-configs shared by copy-on-write clones are not compared
+        cfg.freeze()
+        cfg3 = cfg.clone(copy_on_write=True)
+        cfg3.defrost()
+        cfg3.STR.FOO.KEY1 = 5
+        assert cfg.diff(cfg3).changed == {"STR.FOO.KEY1": (1, 5)}
+        # Leaves changed in place are found even if the configs were fingerprinted
+        a = CN({"T": {"L": [1, 2]}})
+        a.freeze()
+        b = a.clone()
+        a.fingerprint()
+        b.fingerprint()
+        b.defrost()
+        b.T.L.append(3)
+        b.freeze()
+        assert a.diff(b).changed == {"T.L": ([1, 2], [1, 2, 3])}
+        b.fingerprint()
+        b.T.L.append(4)
+        assert a.diff(b).changed == {"T.L": ([1, 2], [1, 2, 3, 4])}
+        # Frozen configs with the same memoized fingerprint have no differences
+        b.T.L.pop()
+        b.T.L.pop()
+        assert a.fingerprint() == b.fingerprint()
+        assert not a.diff(b)
+
     def test_load_from_python_file(self):
         # Case 1: exports CfgNode
         cfg = get_cfg()